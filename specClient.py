@@ -42,6 +42,7 @@ __version__ = 'v1.2.0'
                              context=None, profile=None, **kw)
     PLOT  INTERFACE:
                       plot  (spec, context=None, profile=None, out=None, **kw)
+                 plot_many  (specs, outs, context=None, profile=None, **kw)
          status = prospect  (spec, context=context, profile=profile, **kw)
            image = preview  (id, context=context, profile=profile, **kw)
           image = plotGrid  (id_list, nx, ny, page=<N>,
@@ -49,6 +50,9 @@ __version__ = 'v1.2.0'
       image = stackedImage  (id_list, fmt='png|numpy',
                              align=False, yflip=False,
                              context=context, profile=profile, **kw)
+     plotter = SpecPlotter  (wavelength, flux, xlim=None, ylim=None,
+                             dark=True, out=None)
+                   plotter.update  (overlay)
     UTILITY METHODS:
             df = to_pandas  (npy_data)
     spec1d = to_Spectrum1D  (npy_data)
@@ -63,11 +67,23 @@ Import via
 
 import os
 import sys
+import ast
 import socket
 import json
+import struct
+import tempfile
+import threading
+import time
+import copy
+import hashlib
+import functools
+import inspect
+import importlib.util
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image
 
@@ -80,34 +96,49 @@ warnings.simplefilter('ignore', AstropyWarning)
 import logging
 logging.disable(logging.WARNING)
 logging.getLogger("specutils").setLevel(logging.CRITICAL)
-from specutils import Spectrum1D
-from specutils import SpectrumCollection
 
-from astropy import units as u
-#from astropy.nddata import StdDevUncertainty
-from astropy.nddata import InverseVariance
-from astropy.table import Table
-from matplotlib import pyplot as plt      	# visualization libs
+# Note: specutils, astropy.units/nddata/table and matplotlib are imported
+# in the methods that use them so that a plain query/getSpec session does
+# not pay their import cost.
 
 try:
     import pycurl_requests as requests		# faster 'requests' lib
 except ImportError:
     import requests
 import pycurl					# low-level interface
-from urllib.parse import quote_plus		# URL encoding
+from urllib.parse import quote_plus, urlencode	# URL encoding
+
+try:
+    from numba import njit, prange              # optional JIT kernels
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+try:
+    import orjson                               # fast JSON parsing
+    _jloads = orjson.loads
+except ImportError:
+    _jloads = json.loads
+
+import asyncio
+try:
+    import aiohttp                              # concurrent bulk requests
+    HAVE_AIOHTTP = True
+except ImportError:
+    HAVE_AIOHTTP = False
+try:
+    import httpx                                # HTTP/2 multiplexing
+    HAVE_HTTP2 = importlib.util.find_spec('h2') is not None  # for http2=True
+except ImportError:
+    HAVE_HTTP2 = False
 
 # Data Lab imports.
 #from dl import queryClient
 from dl import storeClient
 from dl.Util import def_token
-from dl.Util import multimethod
 from dl.helpers.utils import convert
 
 
-# Python version check.
-is_py3 = sys.version_info.major == 3
-
-
 # The URL of the service to access.  This may be changed by passing a new
 # URL into the set_svc_url() method before beginning.
 DEF_SERVICE_ROOT = "https://datalab.noao.edu"
@@ -122,10 +153,26 @@ elif THIS_HOST[:5] == 'gp12':
     DEF_SERVICE_ROOT = "http://gp06.datalab.noao.edu:6998"
 
 
-# Allow the service URL for dev/test systems to override the default.
-sock = socket.socket(type=socket.SOCK_DGRAM)     # host IP address
-sock.connect(('8.8.8.8', 1))        # Example IP address, see RFC 5737
-THIS_IP, _ = sock.getsockname()
+# The host IP address is looked up on first use, see _get_host_ip().
+_host_ip = None
+
+
+def _get_host_ip():
+    '''Return the IP address of this host.  The lookup connects a UDP
+       socket (no packets are sent) and is done only once.
+    '''
+    global _host_ip
+    if _host_ip is None:
+        try:
+            sock = socket.socket(type=socket.SOCK_DGRAM)
+            try:
+                sock.connect(('8.8.8.8', 1))    # Example IP, see RFC 5737
+                _host_ip = sock.getsockname()[0]
+            finally:
+                sock.close()
+        except OSError:
+            _host_ip = '127.0.0.1'
+    return _host_ip
 
 DEF_SERVICE_URL = DEF_SERVICE_ROOT + "/spec"
 SM_SERVICE_URL = DEF_SERVICE_ROOT + "/storage"
@@ -134,6 +181,41 @@ QM_SERVICE_URL = DEF_SERVICE_ROOT + "/query"
 # Use cURL for requests when possible.
 USE_CURL = True
 
+# Chunk size (bytes) used when reading streamed responses.
+STREAM_CHUNK = 65536
+
+# Maximum number of concurrent connections for bulk requests.
+MAX_CONNECTIONS = 32
+
+# Content type of a raw (headerless) numpy array response.  The dtype and
+# shape are given in the 'X-Numpy-Dtype' and 'X-Numpy-Shape' headers.
+RAW_NUMPY_TYPE = 'application/x-numpy-raw'
+
+# Lifetime (sec) and maximum number of entries of the service metadata
+# (profiles/contexts/catalogs) cache.
+META_TTL = 300
+META_CACHE_SIZE = 256
+
+# Maximum number of cached listSpan (wavelength span) results.
+LISTSPAN_CACHE_SIZE = 256
+
+# Maximum number of metadata URLs whose ETag and listing are kept.
+ETAG_CACHE_SIZE = 256
+
+# Default optional arguments of the spectrum plot.
+_PLOTSPEC_DEFAULTS = {'dark': True,
+                      'grid': True,
+                      'mark_lines': 'all',
+                      'em_lines': None,
+                      'abs_lines': None,
+                      'values': 'flux,model',
+                      'spec_args': {'color': '#ababab', 'linewidth': 1.0,
+                                    'alpha': 1.0},
+                      'model_args': {'color': 'red', 'linewidth': 1.2},
+                      'sky_args': {'color': 'brown', 'linewidth': 1.0},
+                      'ivar_args': {'color': 'blue', 'linewidth': 1.0}
+                     }
+
 # The requested service "profile".  A profile refers to the specific
 # machines and services used by the service.
 
@@ -177,25 +259,319 @@ class dlSpecError(Exception):
 
 
 # ###################################
-#  Py2/Py3 Compatability Utilities
+#  String Conversion Utilities
 # ###################################
 
 def spcToString(s):
-    '''spcToString -- Force a return value to be type 'string' for all
-                      Python versions.
+    '''spcToString -- Force a return value to be type 'string'.  Values
+                      that are not 'bytes' (or 'bytearray') are returned
+                      unchanged.
+    '''
+    return s.decode('utf-8') if type(s) in (bytes, bytearray) else s
+
+
+def spcToStringList(vals):
+    '''spcToStringList -- Apply spcToString() to each element of an iterable.
+    '''
+    return [v.decode('utf-8') if type(v) in (bytes, bytearray) else v
+            for v in vals]
+
+
+# ###################################
+#  Service Metadata Cache
+# ###################################
+
+_meta_cache = OrderedDict()             # key -> (timestamp, value)
+_meta_cache_lock = threading.Lock()
+
+
+def ttl_cache(ttl):
+    '''ttl_cache -- Decorator to cache a client method's result for 'ttl'
+                    seconds, keyed by the method name, the service URL, a
+                    hash of the auth token and the call arguments.  Fresh
+                    entries are returned directly; an expired entry is
+                    refreshed but still served if the refresh fails.  The
+                    cache is bounded in LRU order.  Calling the method with
+                    'no_cache=True' forces a refresh, and a failure of that
+                    refresh is raised rather than hidden.  A call that
+                    raises is never stored.
+    '''
+    def decorator(fn):
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kw):
+            no_cache = kw.pop('no_cache', False)
+            bound = sig.bind(self, *args, **kw)
+            bound.apply_defaults()
+            tok = self.auth_token or ''
+            key = (fn.__name__, self.svc_url,
+                   hashlib.blake2b(tok.encode(), digest_size=8).hexdigest(),
+                   tuple(bound.arguments.items())[1:])
+
+            now = time.time()
+            with _meta_cache_lock:
+                entry = _meta_cache.get(key)
+                if entry is not None:
+                    _meta_cache.move_to_end(key)
+                    if now - entry[0] < ttl and not no_cache:
+                        return copy.deepcopy(entry[1])
+
+            try:
+                val = fn(self, *args, **kw)
+            except Exception:
+                if entry is None or no_cache:
+                    raise
+                return copy.deepcopy(entry[1])     # serve the stale value
+
+            with _meta_cache_lock:
+                _meta_cache[key] = (now, val)
+                _meta_cache.move_to_end(key)
+                while len(_meta_cache) > META_CACHE_SIZE:
+                    _meta_cache.popitem(last=False)
+            return copy.deepcopy(val)
+        return wrapper
+    return decorator
+
+
+# Cache of Spectrum1D wavelength axes, keyed by the context and the
+# length and endpoints of the log-wavelength grid.
+_axis_cache = {}
+AXIS_CACHE_SIZE = 64
+
+# Parsed (flux, inverse-variance) units, see _fluxUnits().
+_flux_units = None
+
+
+def _fluxUnits():
+    '''_fluxUnits -- Return the SDSS flux unit and the matching inverse
+                     variance unit, parsing them only once.
+    '''
+    global _flux_units
+    if _flux_units is None:
+        from astropy import units as u
+        flux_unit = u.Unit('erg cm-2 s-1 AA-1')
+        _flux_units = (flux_unit, flux_unit**-2)
+    return _flux_units
+
+
+# ###################################
+#  Raw Numpy Response Utilities
+# ###################################
+
+def _rawDtype(descr):
+    '''_rawDtype -- Convert an 'X-Numpy-Dtype' header value, the repr()
+                    of the array's dtype descr, to a dtype.
+    '''
+    return np.lib.format.descr_to_dtype(ast.literal_eval(descr))
+
+
+def _rawShape(shape):
+    '''_rawShape -- Convert an 'X-Numpy-Shape' header value to a tuple.
+    '''
+    return tuple(int(n) for n in shape.split(',') if n != '')
+
+
+def _loadNumpy(content, hdrs):
+    '''_loadNumpy -- Return the array in a response body.  Raw array
+                     payloads are viewed in place with np.frombuffer(),
+                     anything else is read as a .npy file.
+    '''
+    if hdrs.get('Content-Type', '').startswith(RAW_NUMPY_TYPE) and \
+       'X-Numpy-Dtype' in hdrs:
+        return np.frombuffer(content, dtype=_rawDtype(hdrs['X-Numpy-Dtype'])
+                             ).reshape(_rawShape(hdrs['X-Numpy-Shape']))
+    return _npyView(content)
+
+
+def _npyView(buf):
+    '''_npyView -- Return the array in a .npy format buffer as a view of
+                   the buffer rather than a copy.  The array is writable if
+                   the buffer is (e.g. a bytearray).
     '''
-    if is_py3:
-        if isinstance(s, bytes):
-            strval = str(s.decode())
-        elif isinstance(s, str):
-            strval = s
+    mv = memoryview(buf)
+    version = np.lib.format.read_magic(BytesIO(mv[:8]))
+    if version == (1, 0):
+        hlen = 10 + struct.unpack('<H', mv[8:10])[0]
+        read_header = np.lib.format.read_array_header_1_0
+    elif version == (2, 0):
+        hlen = 12 + struct.unpack('<I', mv[8:12])[0]
+        read_header = np.lib.format.read_array_header_2_0
     else:
-        if isinstance(s, bytes) or isinstance(s, unicode):
-            strval = str(s)
-        else:
-            strval = s
+        return np.load(BytesIO(buf), allow_pickle=False)
+
+    shape, fortran_order, dtype = read_header(BytesIO(mv[8:hlen]))
+    if dtype.hasobject:
+        raise dlSpecError('Object arrays are not supported')
+    count = int(np.prod(shape, dtype=np.int64))
+    arr = np.frombuffer(mv, dtype=dtype, count=count, offset=hlen)
+    return arr.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def _stackSpectra(spectra):
+    '''_stackSpectra -- Return a list of spectrum arrays as one array.
+                        Spectra of a common shape and dtype (e.g. padded
+                        to a common span) are stacked into a 2-D array,
+                        otherwise an object array of the spectra is
+                        returned.
+    '''
+    if len(spectra) > 0 and \
+       all(s.shape == spectra[0].shape and s.dtype == spectra[0].dtype
+           for s in spectra):
+        return np.stack(spectra)
+    out = np.empty(len(spectra), dtype=object)
+    for i, s in enumerate(spectra):
+        out[i] = s
+    return out
+
+
+def _splitFrames(buf):
+    '''_splitFrames -- Split a batch response of length-prefixed payloads
+                       (4-byte big-endian size + payload) into a list of
+                       memoryview slices of the buffer.
+    '''
+    mv = memoryview(buf)
+    parts = []
+    off = 0
+    while off < len(mv):
+        if off + 4 > len(mv):
+            raise dlSpecError('Truncated batch frame at offset %d' % off)
+        (nbytes,) = struct.unpack_from('>I', mv, off)
+        off += 4
+        if off + nbytes > len(mv):
+            raise dlSpecError('Truncated batch frame at offset %d' % off)
+        parts.append(mv[off:off+nbytes])
+        off += nbytes
+    return parts
+
+
+# ###################################
+#  Shared HTTP Session
+# ###################################
+
+def _newSession():
+    '''_newSession -- Create a requests Session with a pooled adapter so
+                      calls reuse open (keep-alive) connections.  Idempotent
+                      requests are retried on connection errors.
+    '''
+    sess = requests.Session()
+    if requests.__name__ != 'requests':
+        return sess                     # e.g. pycurl_requests, no mount()
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64,
+                          max_retries=Retry(total=2, backoff_factor=0.1))
+    sess.mount('https://', adapter)
+    sess.mount('http://', adapter)
+    return sess
+
+_session = _newSession()
+
+
+# ###################################
+#  Concurrent Request Utilities
+# ###################################
+
+async def _afetch(session, url, data, headers):
+    '''_afetch -- POST a form payload and return the response headers and
+                  body.  The body is read into a (writable) bytearray.
+    '''
+    async with session.post(url, data=data, headers=headers) as resp:
+        body = bytearray()
+        async for chunk in resp.content.iter_chunked(STREAM_CHUNK):
+            body += chunk
+        return resp.headers.copy(), body
+
+
+async def _afetch_all(url, payloads, headers, timeout=600):
+    '''_afetch_all -- POST each payload to the URL concurrently over a
+                      single pooled session, returning the (headers, body)
+                      responses in the same order as the payloads.
+    '''
+    conn = aiohttp.TCPConnector(limit=MAX_CONNECTIONS)
+    tmout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=conn, timeout=tmout) as sess:
+        return await asyncio.gather(
+            *[_afetch(sess, url, p, headers) for p in payloads])
+
+
+async def _hfetch(client, url, data, headers):
+    '''_hfetch -- httpx version of _afetch().
+    '''
+    async with client.stream('POST', url, data=data, headers=headers) as resp:
+        body = bytearray()
+        async for chunk in resp.aiter_bytes(STREAM_CHUNK):
+            body += chunk
+        return resp.headers, body
+
+
+async def _hfetch_all(url, payloads, headers, timeout=600):
+    '''_hfetch_all -- POST each payload to the URL as concurrent streams on
+                      a multiplexed HTTP/2 connection (where the server
+                      supports it), returning the (headers, body) responses
+                      in the same order as the payloads.
+    '''
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS)
+    async with httpx.AsyncClient(http2=True, limits=limits,
+                                 timeout=timeout) as client:
+        return await asyncio.gather(
+            *[_hfetch(client, url, p, headers) for p in payloads])
+
+
+def _fetch_all(url, payloads, headers, timeout=600):
+    '''_fetch_all -- Issue the requests concurrently, over HTTP/2 when
+                     httpx and h2 are installed, otherwise with aiohttp.
+    '''
+    if HAVE_HTTP2:
+        return _runAsync(_hfetch_all(url, payloads, headers, timeout))
+    return _runAsync(_afetch_all(url, payloads, headers, timeout))
+
+
+def _jsonID(id):
+    '''_jsonID -- Convert a specobjid or (plate,mjd,fiber[,run2d]) tuple
+                  to a JSON-serializable value for a batch request.
+    '''
+    if isinstance(id, tuple):
+        return [v.item() if isinstance(v, np.generic) else v for v in id]
+    return int(id)
+
+
+def _runAsync(coro):
+    '''_runAsync -- Run a coroutine to completion from synchronous code.  If
+                    an event loop is already running (e.g. in a notebook)
+                    the coroutine is run in a private thread.
+    '''
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(asyncio.run, coro).result()
+
 
-    return strval
+# --------------------------------------------------------------------
+# _QUERYARGS -- Map query() arguments to the search position/region.
+#
+def _queryArgs(args, kw):
+    '''Map the positional query() arguments, i.e. (ra, dec, size),
+       (pos, size), (region) or none, to a (ra, dec, size, pos, region)
+       tuple.  The values may also be given as keywords, which are removed
+       from 'kw'.
+    '''
+    ra, dec = kw.pop('ra', None), kw.pop('dec', None)
+    size = kw.pop('size', None)
+    pos, region = kw.pop('pos', None), kw.pop('region', None)
+
+    nargs = len(args)
+    if nargs == 3:
+        ra, dec, size = args
+    elif nargs == 2:
+        pos, size = args
+    elif nargs == 1:
+        region = args[0]
+    elif nargs > 3:
+        raise dlSpecError('query() takes at most 3 positional arguments')
+    return ra, dec, size, pos, region
 
 
 # -----------------------------
@@ -207,7 +583,7 @@ def spcToString(s):
 #
 def set_svc_url(svc_url):
 
-    return sp_client.set_svc_url(svc_url.strip('/'))
+    return _defaultClient().set_svc_url(svc_url.strip('/'))
 
 
 # --------------------------------------------------------------------
@@ -215,7 +591,7 @@ def set_svc_url(svc_url):
 #
 def get_svc_url():
 
-    return sp_client.get_svc_url()
+    return _defaultClient().get_svc_url()
 
 
 # --------------------------------------------------------------------
@@ -223,7 +599,7 @@ def get_svc_url():
 #
 def set_profile(profile):
 
-    return sp_client.set_profile(profile)
+    return _defaultClient().set_profile(profile)
 
 
 # --------------------------------------------------------------------
@@ -231,7 +607,7 @@ def set_profile(profile):
 #
 def get_profile():
 
-    return sp_client.get_profile()
+    return _defaultClient().get_profile()
 
 
 # --------------------------------------------------------------------
@@ -239,7 +615,7 @@ def get_profile():
 #
 def set_context(context):
 
-    return sp_client.set_context(context)
+    return _defaultClient().set_context(context)
 
 
 # --------------------------------------------------------------------
@@ -247,7 +623,7 @@ def set_context(context):
 #
 def get_context():
 
-    return sp_client.get_context()
+    return _defaultClient().get_context()
 
 
 # --------------------------------------------------------------------
@@ -255,28 +631,19 @@ def get_context():
 #
 def isAlive(svc_url=DEF_SERVICE_URL, timeout=5):
 
-    return sp_client.isAlive(svc_url=svc_url, timeout=timeout)
+    return _defaultClient().isAlive(svc_url=svc_url, timeout=timeout)
 
 
 # --------------------------------------------------------------------
 # LIST_PROFILES -- List the available service profiles.
 #
-@multimethod('spc', 1, False)
-def list_profiles(profile, fmt='text'):
-
-    return sp_client._list_profiles(profile=profile, fmt=fmt)
-
-
-@multimethod('spc', 0, False)
-def list_profiles(profile=None, fmt='text'):
+def list_profiles(profile=None, fmt='text', no_cache=False):
 
     '''Retrieve the profiles supported by the spectro data service.
 
     Usage:
-        list_profiles ([profile], fmt='text')
+        list_profiles ([profile], fmt='text', no_cache=False)
 
-    MultiMethod Usage:
-    ------------------
             specClient.list_profiles (profile)
             specClient.list_profiles ()
 
@@ -289,6 +656,9 @@ def list_profiles(profile=None, fmt='text'):
     format: str
         Result format: One of 'text' or 'json'
 
+    no_cache: bool
+        If True, bypass the cached value and query the service.
+
     Returns
     -------
     profiles: list/dict
@@ -302,26 +672,19 @@ def list_profiles(profile=None, fmt='text'):
         profiles = specClient.list_profiles(profile)
         profiles = specClient.list_profiles()
     '''
-    return sp_client._list_profiles(profile=profile, fmt=fmt)
+    return _defaultClient()._list_profiles(profile=profile, fmt=fmt,
+                                    no_cache=no_cache)
 
 
 # --------------------------------------------------------------------
 # LIST_CONTEXTS -- List the available dataset contexts.
 #
-@multimethod('spc',1,False)
-def list_contexts(context, fmt='text'):
-    return sp_client._list_contexts(context=context, fmt=fmt)
-
-
-@multimethod('spc',0,False)
-def list_contexts(context=None, fmt='text'):
+def list_contexts(context=None, fmt='text', no_cache=False):
     '''Retrieve the contexts supported by the spectro data service.
 
     Usage:
-        list_contexts ([context], fmt='text')
+        list_contexts ([context], fmt='text', no_cache=False)
 
-    MultiMethod Usage:
-    ------------------
             specClient.list_contexts (context)
             specClient.list_contexts ()
 
@@ -334,6 +697,9 @@ def list_contexts(context=None, fmt='text'):
     format: str
         Result format: One of 'text' or 'json'
 
+    no_cache: bool
+        If True, bypass the cached value and query the service.
+
     Returns
     -------
     contexts: list/dict
@@ -347,16 +713,29 @@ def list_contexts(context=None, fmt='text'):
         contexts = specClient.list_contexts(context)
         contexts = specClient.list_contexts()
     '''
-    return sp_client._list_contexts(context=context, fmt=fmt)
+    return _defaultClient()._list_contexts(context=context, fmt=fmt,
+                                    no_cache=no_cache)
 
 
 # --------------------------------------------------------------------
 # CATALOGS -- List available catalogs for a given dataset context
 #
-def catalogs(context='default', profile='default', fmt='text'):
+def catalogs(context='default', profile='default', fmt='text',
+             no_cache=False):
     '''List available catalogs for a given dataset context
     '''
-    return sp_client.catalogs(context=context, profile=profile, fmt=fmt)
+    return _defaultClient().catalogs(context=context, profile=profile, fmt=fmt,
+                              no_cache=no_cache)
+
+
+# --------------------------------------------------------------------
+# CLEAR_CACHE -- Discard cached service metadata.
+#
+def clear_cache():
+    '''Discard the cached profile, context and catalog listings so the
+       next call queries the service.
+    '''
+    return _defaultClient().clear_cache()
 
 
 # --------------------------------------------------------------------
@@ -365,7 +744,7 @@ def catalogs(context='default', profile='default', fmt='text'):
 def to_Spectrum1D(npy_data):
     '''Utility method to convert a Numpy array to Spectrum1D
     '''
-    return sp_client.to_Spectrum1D(npy_data)
+    return _defaultClient().to_Spectrum1D(npy_data)
 
 
 # --------------------------------------------------------------------
@@ -374,7 +753,7 @@ def to_Spectrum1D(npy_data):
 def to_pandas(npy_data):
     '''Utility method to convert a Numpy array to a Pandas DataFrame
     '''
-    return sp_client.to_pandas(npy_data)
+    return _defaultClient().to_pandas(npy_data)
 
 
 # --------------------------------------------------------------------
@@ -383,7 +762,7 @@ def to_pandas(npy_data):
 def to_Table(npy_data):
     '''Utility method to convert a Numpy array to an Astropy Table object.
     '''
-    return sp_client.to_Table(npy_data)
+    return _defaultClient().to_Table(npy_data)
 
 
 
@@ -395,44 +774,8 @@ def to_Table(npy_data):
 # --------------------------------------------------------------------
 # QUERY -- Query for spectra by position.
 #
-@multimethod('spc',3,False)
-def query(ra, dec, size, constraint=None, out=None,
-          context=None, profile=None, **kw):
-
-    return sp_client._query(ra=ra, dec=dec, size=size,
-                            pos=None,
-                            region=None,
-                            constraint=constraint,
-                            out=out,
-                            context=context, profile=profile, **kw)
-
-
-@multimethod('spc',2,False)
-def query(pos, size, constraint=None, out=None,
-          context=None, profile=None, **kw):
-
-    return sp_client._query(ra=None, dec=None, size=size,
-                            pos=pos,
-                            region=None,
-                            constraint=constraint,
-                            out=out,
-                            context=context, profile=profile, **kw)
-
-
-@multimethod('spc',1,False)
-def query(region, constraint=None, out=None,
-          context=None, profile=None, **kw):
-
-    return sp_client._query(ra=None, dec=None, size=None,
-                            pos=None,
-                            region=region,
-                            constraint=constraint,
-                            out=out,
-                            context=context, profile=profile, **kw)
-
-
-@multimethod('spc',0,False)
-def query(constraint=None, out=None, context=None, profile=None, **kw):
+def query(*args, constraint=None, out=None, context=None, profile=None,
+          **kw):
 
     '''Query for a list of spectrum IDs that can then be retrieved from
         the service.
@@ -516,9 +859,10 @@ def query(constraint=None, out=None, context=None, profile=None, **kw):
         .. code-block:: python
             id_list = spec.query (0.125, 12.123, 0.1)
     '''
-    return sp_client._query(ra=None, dec=None, size=None,
-                            pos=None,
-                            region=None,
+    ra, dec, size, pos, region = _queryArgs(args, kw)
+    return _defaultClient()._query(ra=ra, dec=dec, size=size,
+                            pos=pos,
+                            region=region,
                             constraint=constraint,
                             out=out,
                             context=context, profile=profile, **kw)
@@ -593,7 +937,7 @@ def getSpec(id_list, fmt='numpy', out=None, align=False, cutout=None,
             .... 'spec' is an array of NumPy objects that may be
                  different sizes
     '''
-    return sp_client.getSpec(id_list=id_list, fmt=fmt, out=out,
+    return _defaultClient().getSpec(id_list=id_list, fmt=fmt, out=out,
                              align=align, cutout=cutout,
                              context=context, profile=profile, **kw)
 
@@ -660,8 +1004,55 @@ def plot(spec, context=None, profile=None, out=None, **kw):
             spec.plot (specID, context='sdss_dr16', out='vos://spec.png')
 
     '''
-    return sp_client.plot(spec, context=context, profile=profile,
-                          out=None, **kw)
+    return _defaultClient().plot(spec, context=context, profile=profile,
+                          out=out, **kw)
+
+
+# --------------------------------------------------------------------
+# PLOT_MANY -- Plot a list of spectra to output files in parallel.
+#
+def plot_many(specs, outs, context=None, profile=None, nthreads=None, **kw):
+    '''Plot a list of spectra to output files in parallel.
+
+    Usage:
+        spec.plot_many(specs, outs, context=None, profile=None, **kw)
+
+    Parameters
+    ----------
+    specs: list
+        Spectra to be plotted, each an object ID or data array as
+        accepted by plot().
+
+    outs: list
+        Output filenames, one for each spectrum in 'specs'.
+
+    context: str
+        Dataset context.
+
+    profile: str
+        Data service profile.
+
+    nthreads: int
+        Number of worker threads (def: number of CPUs).
+
+    **kw: dict
+        Optional plot() keyword arguments applied to every spectrum.
+
+    Returns
+    -------
+    result: str
+        Status 'OK' string.
+
+    Example
+    -------
+       1) Plot a list of spectra to PNG files:
+
+        .. code-block:: python
+            outs = ['spec_%d.png' % i for i in range(len(id_list))]
+            spec.plot_many (id_list, outs)
+    '''
+    return _defaultClient().plot_many(specs, outs, context=context, profile=profile,
+                               nthreads=nthreads, **kw)
 
 
 # --------------------------------------------------------------------
@@ -747,7 +1138,7 @@ def preview(spec, context=None, profile=None, **kw):
                     format='png', width=400, height=100, unconfined=True))
     '''
     pass
-    return sp_client.preview(spec, context=context, profile=profile, **kw)
+    return _defaultClient().preview(spec, context=context, profile=profile, **kw)
 
 
 # --------------------------------------------------------------------
@@ -803,7 +1194,7 @@ def plotGrid(id_list, nx, ny, page=0, context=None, profile=None, **kw):
                 display(Image(data, format='png',
                         width=400, height=100, unconfined=True))
     '''
-    return sp_client.plotGrid(id_list, nx, ny, page=page,
+    return _defaultClient().plotGrid(id_list, nx, ny, page=page,
                               context=context, profile=profile, **kw)
 
 
@@ -848,7 +1239,7 @@ def stackedImage(id_list, align=False, yflip=False,
 
     '''
     pass
-    return sp_client.stackedImage(id_list, align=align, yflip=yflip,
+    return _defaultClient().stackedImage(id_list, align=align, yflip=yflip,
                                   context=context, profile=profile, **kw)
 
 
@@ -869,20 +1260,64 @@ class specClient(object):
         self.svc_url = DEF_SERVICE_URL          # service URL
         self.qm_svc_url = QM_SERVICE_URL        # Query Manager service URL
         self.sm_svc_url = SM_SERVICE_URL        # Storage Manager service URL
-        self.auth_token = def_token(None)       # default auth token (not used)
+        self.auth_token = def_token(None)       # default auth token
         self.svc_profile = profile              # service profile
         self.svc_context = context              # dataset context
+        self._set_url_prefixes()
 
-        self.hostip = THIS_IP
-        self.hostname = THIS_HOST
+        self._hostip = None                     # resolved on first use
+        self._hostname = None
         self.debug = DEBUG                      # interface debug flag
         self.verbose = VERBOSE                  # interface verbose flag
 
+        # Static portion of the service call headers, and a cache of the
+        # complete header dict keyed by the raw token string.  The host
+        # fields are added in getHeaders() so the IP lookup stays lazy.
+        self._base_hdrs = {'Content-Type': 'text/ascii',
+                           'X-DL-ClientVersion': __version__}
+        self._hdr_cache = {}
+
+        # Persistent connection handles so repeated administrative calls
+        # reuse an open (keep-alive) connection.
+        self._curl = pycurl.Curl()
+        self._curl.setopt(pycurl.TCP_KEEPALIVE, 1)
+        self._curl.setopt(pycurl.FORBID_REUSE, 0)
+        self._curl.setopt(pycurl.FRESH_CONNECT, 0)
+        self._curl_lock = threading.Lock()
+        self._session = _session                # shared, pooled
+
+        # Set of (svc_url, what, value) tuples already validated as 'OK'.
+        self._validate_cache = set()
+
+        # (ETag, value) of the last metadata listing read from each URL,
+        # in LRU order.
+        self._etags = OrderedDict()
+
+        # LRU cache of listSpan results, keyed by a hash of the ID list.
+        self._listspan_cache = OrderedDict()
+
         # Get the server-side config for the context.  Note this must also
         # be updated whenever we do a set_svc_url() or set_context().
         self.context = self._list_contexts(context)
 
 
+    @property
+    def hostip(self):
+        '''Local host IP address, resolved once and cached.
+        '''
+        if self._hostip is None:
+            self._hostip = _get_host_ip()
+        return self._hostip
+
+    @property
+    def hostname(self):
+        '''Local host name, resolved once and cached.
+        '''
+        if self._hostname is None:
+            self._hostname = THIS_HOST
+        return self._hostname
+
+
     # Standard Data Lab service methods.
     #
     def set_svc_url(self, svc_url):
@@ -906,8 +1341,24 @@ class specClient(object):
             specClient.set_svc_url("http://localhost:7001/")
         '''
         self.svc_url = spcToString(svc_url.strip('/'))
+        self._set_url_prefixes()
         self.context = self._list_contexts(context=self.svc_context)
 
+    def _set_url_prefixes(self):
+        '''Precompute the fixed URL prefixes of the frequently-called
+           service endpoints.  Must be redone whenever svc_url changes.
+        '''
+        self._validate_prefix = f'{self.svc_url}/validate?what='
+        self._query_prefix = f'{self.svc_url}/query?'
+        self._listspan_url = f'{self.svc_url}/listSpan'
+        self._getspec_url = f'{self.svc_url}/getSpec'
+        self._profiles_prefix = f'{self.svc_url}/profiles?'
+        self._contexts_prefix = f'{self.svc_url}/contexts?'
+        self._catalogs_prefix = f'{self.svc_url}/catalogs?'
+        self._preview_prefix = f'{self.svc_url}/preview?'
+        self._plotgrid_url = f'{self.svc_url}/plotGrid'
+        self._stackedimage_url = f'{self.svc_url}/stackedImage'
+
     def get_svc_url(self):
         '''Return the currently-used Spectroscopic Data Service URL.
 
@@ -948,13 +1399,11 @@ class specClient(object):
             from dl import specClient
             profile = specClient.client.set_profile("dev")
         '''
-        url = self.svc_url + '/validate?what=profile&value=%s' % profile
-        if spcToString(self.curl_get(url)) == 'OK':
+        if self._validate('profile', profile):
             self.svc_profile = spcToString(profile)
             return 'OK'
         else:
             raise Exception('Invalid profile "%s"' % profile)
-        return 'OK'
 
     def get_profile(self):
         '''Get the requested service profile.
@@ -996,8 +1445,7 @@ class specClient(object):
             from dl import specClient
             context = specClient.client.set_context("dev")
         '''
-        url = self.svc_url + '/validate?what=context&value=%s' % context
-        if spcToString(self.curl_get(url)) == 'OK':
+        if self._validate('context', context):
             self.svc_context = spcToString(context)
             self.context = self._list_contexts(context=self.svc_context)
             return 'OK'
@@ -1049,7 +1497,7 @@ class specClient(object):
         '''
         url = svc_url
         try:
-            r = requests.get(url, timeout=2)
+            r = self._session.get(url, timeout=2)
             resp = r.text
 
             if r.status_code != 200:
@@ -1066,81 +1514,94 @@ class specClient(object):
     #  UTILITY METHODS
     ###################################################
 
-    @multimethod('_spc',1,True)
-    def list_profiles(self, profile, fmt='text'):
-        '''Usage:  specClient.client.list_profiles (profile, ...)
-        '''
-        return self._list_profiles(profile=profile, fmt=fmt)
-
-    @multimethod('_spc',0,True)
-    def list_profiles(self, profile=None, fmt='text'):
-        '''Usage:  specClient.client.list_profiles (...)
+    def list_profiles(self, profile=None, fmt='text', no_cache=False):
+        '''Usage:  specClient.client.list_profiles ([profile], ...)
         '''
-        return self._list_profiles(profile=profile, fmt=fmt)
+        return self._list_profiles(profile=profile, fmt=fmt,
+                                   no_cache=no_cache)
 
+    @ttl_cache(META_TTL)
     def _list_profiles(self, profile=None, fmt='text'):
         '''Implementation of the list_profiles() method.
         '''
-        headers = self.getHeaders(def_token(None))
-
-        svc_url = '%s/profiles?' % self.svc_url
-        svc_url += "profile=%s&" % profile
-        svc_url += "format=%s" % fmt
-
-        r = requests.get(svc_url, headers=headers)
-        profiles = spcToString(r.content)
-        if '{' in profiles:
-            profiles = json.loads(profiles)
+        headers = self.getHeaders(None)
 
-        return profiles
+        svc_url = self._profiles_prefix + \
+                  urlencode({'profile': profile, 'format': fmt})
 
+        return self._get_meta(svc_url, headers)
 
 
-    @multimethod('_spc',1,True)
-    def list_contexts(self, context, fmt='text'):
-        '''Usage:  specClient.client.list_contexts (context, ...)
-        '''
-        return self._list_contexts(context=context, fmt=fmt)
 
-    @multimethod('_spc',0,True)
-    def list_contexts(self, context=None, fmt='text'):
-        '''Usage:  specClient.client.list_contexts (...)
+    def list_contexts(self, context=None, fmt='text', no_cache=False):
+        '''Usage:  specClient.client.list_contexts ([context], ...)
         '''
-        return self._list_contexts(context=context, fmt=fmt)
+        return self._list_contexts(context=context, fmt=fmt,
+                                   no_cache=no_cache)
 
+    @ttl_cache(META_TTL)
     def _list_contexts(self, context=None, fmt='text'):
         '''Implementation of the list_contexts() method.
         '''
-        headers = self.getHeaders(def_token(None))
-
-        svc_url = '%s/contexts?' % self.svc_url
-        svc_url += "context=%s&" % context
-        svc_url += "format=%s" % fmt
+        headers = self.getHeaders(None)
 
-        r = requests.get(svc_url, headers=headers)
-        contexts = spcToString(r.content)
-        if '{' in contexts:
-            contexts = json.loads(contexts)
+        svc_url = self._contexts_prefix + \
+                  urlencode({'context': context, 'format': fmt})
 
-        return contexts
+        return self._get_meta(svc_url, headers)
 
 
+    @ttl_cache(META_TTL)
     def catalogs(self, context='default', profile='default', fmt='text'):
         '''Usage:  specClient.client.catalogs (...)
         '''
         headers = self.getHeaders(None)
 
-        svc_url = '%s/catalogs?' % self.svc_url
-        svc_url += "context=%s&" % context
-        svc_url += "profile=%s&" % profile
-        svc_url += "format=%s" % fmt
+        svc_url = self._catalogs_prefix + \
+                  urlencode({'context': context, 'profile': profile,
+                             'format': fmt})
+
+        return self._get_meta(svc_url, headers)
 
-        r = requests.get(svc_url, headers=headers)
-        catalogs = spcToString(r.text)
-        if '{' in catalogs:
-            catalogs = json.loads(catalogs)
+    def clear_cache(self):
+        '''Usage:  specClient.client.clear_cache ()
+        '''
+        with _meta_cache_lock:
+            _meta_cache.clear()
+        self._etags.clear()
+        self._validate_cache.clear()
+        self._listspan_cache.clear()
+
+    def _get_meta(self, url, headers):
+        '''GET a service metadata listing, decoding JSON replies.  A reply
+           carrying an ETag is kept so the next request for the URL can be
+           made conditional; a 304 reply then reuses the kept value.  Any
+           other non-200 reply raises a dlSpecError so it is never cached.
+        '''
+        prev = self._etags.get(url)
+        if prev is not None:
+            self._etags.move_to_end(url)
+            headers = dict(headers)
+            headers['If-None-Match'] = prev[0]
+
+        r = self._session.get(url, headers=headers)
+        if r.status_code == 304 and prev is not None:
+            return prev[1]
+        if r.status_code != 200:
+            raise dlSpecError('Error %d reading %s: %s' %
+                              (r.status_code, url, spcToString(r.content)))
 
-        return spcToString(catalogs)
+        try:
+            value = _jloads(r.content)
+        except ValueError:                      # not JSON, e.g. 'text' fmt
+            value = spcToString(r.content)
+        etag = r.headers.get('ETag')
+        if etag is not None and r.status_code == 200:
+            self._etags[url] = (etag, value)
+            self._etags.move_to_end(url)
+            if len(self._etags) > ETAG_CACHE_SIZE:
+                self._etags.popitem(last=False)
+        return value
 
 
     # --------------------------------------------------------------------
@@ -1150,25 +1611,71 @@ class specClient(object):
 
         ''' Convert a Numpy spectrum array to a Spectrum1D object.
         '''
+        from specutils import Spectrum1D
+        from astropy import units as u
+        from astropy.nddata import InverseVariance
+        try:
+            from specutils.spectra.spectral_axis import SpectralAxis
+        except ImportError:
+            SpectralAxis = None
+
         if npy_data.ndim == 2:
-            lamb = 10**npy_data['loglam'][0] * u.AA
+            loglam = npy_data['loglam'][0]
         else:
-            lamb = 10**npy_data['loglam'] * u.AA
-        flux = npy_data['flux'] * 10**-17 * u.Unit('erg cm-2 s-1 AA-1')
+            loglam = npy_data['loglam']
+
+        # Spectra on the same log-linear grid share one wavelength axis.
+        key = (self.svc_context, len(loglam),
+               float(loglam[0]), float(loglam[-1]))
+        lamb = _axis_cache.get(key)
+        if lamb is None:
+            lamb = 10**loglam * u.AA
+            if SpectralAxis is not None:
+                lamb = SpectralAxis(lamb)
+            if len(_axis_cache) >= AXIS_CACHE_SIZE:
+                _axis_cache.clear()
+            _axis_cache[key] = lamb
+        # Scale the values into new arrays once and wrap them without
+        # further copies; the units are parsed only on the first call.
+        flux_unit, ivar_unit = _fluxUnits()
+        flux = u.Quantity(np.multiply(npy_data['flux'], 1e-17), flux_unit,
+                          copy=False)
         mask = npy_data['flux'] == 0
-        flux_unit = u.Unit('erg cm-2 s-1 AA-1')
-        uncertainty = InverseVariance(npy_data['ivar'] / flux_unit**2)
+        uncertainty = InverseVariance(npy_data['ivar'], unit=ivar_unit)
 
         spec1d = Spectrum1D(spectral_axis=lamb, flux=flux,
                             uncertainty=uncertainty, mask=mask)
 
-        spec1d.meta['sky'] = npy_data['sky'] * 10**-17 * flux_unit
-        spec1d.meta['model'] = npy_data['model'] * 10**-17 * flux_unit
+        spec1d.meta['sky'] = u.Quantity(np.multiply(npy_data['sky'], 1e-17),
+                                        flux_unit, copy=False)
+        spec1d.meta['model'] = u.Quantity(np.multiply(npy_data['model'],
+                                                      1e-17),
+                                          flux_unit, copy=False)
         spec1d.meta['ivar'] = npy_data['ivar']
 
         return spec1d
 
 
+    def _to_SpectrumCollection(self, npy_data):
+        ''' Convert an aligned (nspec, npix) Numpy spectrum array to a
+            SpectrumCollection in a single construction.
+        '''
+        from specutils import SpectrumCollection
+        from astropy import units as u
+        from astropy.nddata import InverseVariance
+
+        flux_unit, ivar_unit = _fluxUnits()
+        lamb = u.Quantity(np.power(10.0, npy_data['loglam']), u.AA,
+                          copy=False)
+        flux = u.Quantity(np.multiply(npy_data['flux'], 1e-17), flux_unit,
+                          copy=False)
+        uncertainty = InverseVariance(npy_data['ivar'], unit=ivar_unit)
+
+        return SpectrumCollection(flux=flux, spectral_axis=lamb,
+                                  uncertainty=uncertainty,
+                                  mask=(npy_data['flux'] == 0))
+
+
     # --------------------------------------------------------------------
     # TO_PANDAS -- Utility method to convert a Numpy array to a Pandas DataFrame
     #
@@ -1176,7 +1683,8 @@ class specClient(object):
 
         '''Utility method to convert a Numpy array to a Pandas DataFrame
         '''
-        return pd.DataFrame(data=npy_data, columns=npy_data.dtype.names)
+        return pd.DataFrame({name: npy_data[name]
+                             for name in npy_data.dtype.names}, copy=False)
 
 
     # --------------------------------------------------------------------
@@ -1186,7 +1694,9 @@ class specClient(object):
 
         '''Utility method to convert a Numpy array to an Astropy Table object.
         '''
-        return Table(data=npy_data, names=npy_data.dtype.names)
+        from astropy.table import Table
+
+        return Table(npy_data, copy=False)
 
 
 
@@ -1197,38 +1707,7 @@ class specClient(object):
     # --------------------------------------------------------------------
     # QUERY -- Query for spectra by position.
     #
-    @multimethod('_spc',3,True)
-    def query(self, ra, dec, size, constraint=None, out=None,
-              context=None, profile=None, **kw):
-        return self._query(ra=ra, dec=dec, size=size,
-                           pos=None,
-                           region=None,
-                           constraint=constraint,
-                           out=out,
-                           context=context, profile=profile, **kw)
-
-    @multimethod('_spc',2,True)
-    def query(self, pos, size, constraint=None, out=None,
-              context=None, profile=None, **kw):
-        return self._query(ra=None, dec=None, size=None,
-                           pos=pos,
-                           region=None,
-                           constraint=constraint,
-                           out=out,
-                           context=context, profile=profile, **kw)
-
-    @multimethod('_spc',1,True)
-    def query(self, region, constraint=None, out=None,
-              context=None, profile=None, **kw):
-        return self._query(ra=None, dec=None, size=None,
-                           pos=None,
-                           region=region,
-                           constraint=constraint,
-                           out=out,
-                           context=context, profile=profile, **kw)
-
-    @multimethod('_spc',0,True)
-    def query(self, constraint=None, out=None,
+    def query(self, *args, constraint=None, out=None,
               context=None, profile=None, **kw):
         '''Query for a list of spectrum IDs that can then be retrieved from
             the service.
@@ -1310,9 +1789,10 @@ class specClient(object):
             .. code-block:: python
                 id_list = spec.query (0.125, 12.123, 0.1)
         '''
-        return self._query(ra=None, dec=None, size=None,
-                           pos=None,
-                           region=None,
+        ra, dec, size, pos, region = _queryArgs(args, kw)
+        return self._query(ra=ra, dec=dec, size=size,
+                           pos=pos,
+                           region=region,
                            constraint=constraint,
                            out=out,
                            context=context, profile=profile, **kw)
@@ -1369,7 +1849,7 @@ class specClient(object):
         headers = self.getHeaders(None)
 
         # Query for the ID/fields.
-        _svc_url = '%s/query?' % self.svc_url           # base service URL
+        _svc_url = self._query_prefix                   # base service URL
         _svc_url += 'id=&'	                        # no ID value
         _svc_url += 'fields=%s&' % quote_plus(ofields)  # fields to retrieve
         _svc_url += 'catalog=%s&' % quote_plus(catalog) # catalog to query
@@ -1378,26 +1858,31 @@ class specClient(object):
         _svc_url += 'profile=%s&' % profile             # service profile
         _svc_url += 'debug=%s&' % debug                 # system debug flag
         _svc_url += 'verbose=%s' % False           # system verbose flag
-        r = requests.get(_svc_url, headers=headers)
-        _res = spcToString(r.content)
-
-        # Query result is in CSV, convert to a named table.
-        res = convert(_res, outfmt='table')
+        r = self._session.get(_svc_url, headers=headers)
 
         if out in [None, '']:
+            # Query result is in CSV.  Multiple fields are converted to a
+            # named table.
             if ofields.count(',') > 0:
-                return res
+                return convert(spcToString(r.content), outfmt='table')
             else:
-                return np.array(res[self.context['id_main']])
+                # A single ID column is parsed directly from the response
+                # bytes by the pandas C reader and returned as a flat
+                # uint64 array, whatever the values (or no rows).
+                id_main = self.context['id_main']
+                if not r.content.strip():
+                    return np.empty(0, dtype=np.uint64)
+                res = pd.read_csv(BytesIO(r.content), engine='c',
+                                  dtype={id_main: np.uint64})
+                return res[id_main].to_numpy(dtype=np.uint64)
         else:
-            # Note:  memory expensive for large lists .....
-            csv_text = _res
+            # Save the CSV as returned, without parsing it into a table.
             if out.startswith('vos://'):
-                return storeClient.saveAs(csv_text, out)[0]
+                return storeClient.saveAs(spcToString(r.content), out)[0]
             else:
-                with open(out, "w") as fd:
-                    fd.write(csv_text)
-                    fd.write('\n')
+                with open(out, "wb") as fd:
+                    fd.write(r.content)
+                    fd.write(b'\n')
                 return 'OK'
 
 
@@ -1485,11 +1970,8 @@ class specClient(object):
         debug = kw['debug'] if 'debug' in kw else self.debug
 
         # Set service call headers.
-        headers = {'Content-Type': 'application/x-www-form-urlencoded',
-                   'X-DL-ClientVersion': __version__,
-                   'X-DL-OriginIP': self.hostip,
-                   'X-DL-OriginHost': self.hostname,
-                   'X-DL-AuthToken': def_token(None)}
+        headers = self.getHeaders(token)
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
 
         if debug:
             print('getSpec(): in ty id_list = ' + str(type(id_list)))
@@ -1498,7 +1980,8 @@ class specClient(object):
         ids = self.extractIDList(id_list)
 
         # Force alignment for SpectrumCollection format.
-        if fmt.lower() == 'spectrumcollection':
+        _fmt = fmt.lower()
+        if _fmt == 'spectrumcollection':
             align = True
 
         if debug:
@@ -1518,78 +2001,198 @@ class specClient(object):
                 'verbose': verbose
               }
 
-        # Get the limits of the collection
-        url = '%s/listSpan' % self.svc_url
-        resp = requests.post(url, data=data, headers=headers)
-        v = json.loads(resp.text)
-        data['w0'], data['w1'] = v['w0'], v['w1']
-
-        url = '%s/getSpec' % self.svc_url
+        url = self._getspec_url
         if align:
             # If we're aligning columns, the server will pad the values
             # and return a common array size.
-            resp = requests.post(url, data=data, headers=headers)
-            _data = np.load(BytesIO(resp.content), allow_pickle=False)
+            self._setSpan(data, headers, context, profile)
+            _data = self._postNumpy(url, data, headers)
         else:
-            # If not aligning columns, request each spectrum individually
-            # so we can return a list object.
-            _data = []
-            for id in ids:
-                data['id_list'] = str(id)
-                resp = requests.post(url, data=data, headers=headers)
-                if fmt.lower() == 'fits':
-                    _data.append(resp.content)
+            # If not aligning columns, first try to get a list of integer
+            # IDs in a single batched request.  The batch endpoint finds
+            # the span of the list itself.
+            _data = None
+            if len(ids) > 1 and \
+               all(isinstance(i, (int, np.integer, tuple)) for i in ids):
+                _data = self._batch_getSpec(ids, fmt=fmt, values=values,
+                                            cutout=cutout, context=context,
+                                            profile=profile)
+
+            if _data is None:
+                self._setSpan(data, headers, context, profile)
+                # Otherwise request each spectrum individually so we can
+                # return a list object.  Multiple requests are issued
+                # concurrently when possible.
+                payloads = [{k: str(v)
+                             for k, v in dict(data, id_list=id).items()}
+                            for id in ids]
+                if len(payloads) > 1 and (HAVE_HTTP2 or HAVE_AIOHTTP):
+                    if _fmt == 'fits':
+                        resps = _fetch_all(url, payloads, headers)
+                        _data = [bytes(content) for hdrs, content in resps]
+                    else:
+                        hdrs = dict(headers, Accept=RAW_NUMPY_TYPE + \
+                                    ', application/octet-stream')
+                        resps = _fetch_all(url, payloads, hdrs)
+                        _data = [_loadNumpy(content, hdrs)
+                                 for hdrs, content in resps]
                 else:
-                    np_data = np.load(BytesIO(resp.content), allow_pickle=False)
-                    _data.append(np_data)
-            if fmt.lower() != 'fits':
-                _data = np.array(_data)
-
-        if fmt.lower() == 'fits':
-            # Note: assumes a single file is requested.
-            if len(_data) == 1:
-                return _data[0]
+                    # Otherwise use a thread pool over the shared (pooled)
+                    # session.  map() preserves the request order.
+                    def fetch(p):
+                        if _fmt == 'fits':
+                            return self._session.post(url, data=p,
+                                                      headers=headers).content
+                        return self._postNumpy(url, p, headers)
+                    nthreads = max(1, min(MAX_CONNECTIONS, len(payloads)))
+                    with ThreadPoolExecutor(max_workers=nthreads) as ex:
+                        _data = list(ex.map(fetch, payloads))
+            if _fmt != 'fits':
+                _data = _stackSpectra(_data)
+
+        # Convert to the requested format.  Note a single result is
+        # returned as-is rather than as a list.
+        single = (len(_data) == 1)
+        if _fmt == 'fits' or _fmt[:5] == 'numpy':       # FITS / NUMPY array
+            return _data[0] if single else _data
+
+        convert = {'pandas': self.to_pandas,            # Pandas DataFrame
+                   'tables': self.to_Table}.get(_fmt[:6])   # Astropy Table
+        if convert is not None:
+            return convert(_data[0]) if single else [convert(d) for d in _data]
+        elif _fmt[:8] == 'spectrum':                    # Spectrum1D
+            if single:
+                return self.to_Spectrum1D(_data[0])
+            elif align:
+                # Aligned spectra share one array, so a collection can
+                # be built from it directly.
+                if _fmt == 'spectrumcollection':
+                    return self._to_SpectrumCollection(_data)
+                return self.to_Spectrum1D(_data)
             else:
-                return _data
-        else:
-            if fmt.lower()[:5] == 'numpy':		# NUMPY array
-                if len(_data) == 1:
-                    return _data[0]
-                else:
-                    return _data
-            elif fmt.lower()[:6] == 'pandas':		# Pandas DataFrame
-                if len(_data) == 1:
-                    return self.to_pandas(_data[0])
-                else:
-                    pd_data = []
-                    for d in _data:
-                        pd_data.append(self.to_pandas(d))
-                    return pd_data
-            elif fmt.lower()[:6] == 'tables':		# Astropy Table
-                if len(_data) == 1:
-                    return self.to_Table(_data[0])
-                else:
-                    tb_data = []
-                    for d in _data:
-                        tb_data.append(self.to_Table(d))
-                    return tb_data
-            elif fmt.lower()[:8] == 'spectrum':		# Spectrum1D
-                if len(_data) == 1:
-                    return self.to_Spectrum1D(_data[0])
-                elif align:
-                    return self.to_Spectrum1D(_data)
+                sp_data = [self.to_Spectrum1D(d) for d in _data]
+
+                # Convert to a SpectrumCollection object if requested.
+                if _fmt == 'spectrumcollection':
+                    from specutils import SpectrumCollection
+                    return SpectrumCollection.from_spectra(sp_data)
                 else:
-                    sp_data = []
-                    for i in range(len(_data)):
-                        sp_data.append(self.to_Spectrum1D(_data[i]))
+                    return sp_data
+        else:
+            raise Exception("Unknown return format '%s'" % fmt)
 
-                    # Convert to a SpectrumCollection object if requested.
-                    if fmt.lower() == 'spectrumcollection':
-                        return SpectrumCollection.from_spectra(sp_data)
-                    else:
-                        return sp_data
-            else:
-                raise Exception("Unknown return format '%s'" % fmt)
+
+    def _postNumpy(self, url, data, headers):
+        '''POST a request for numpy data and return the array.  If the
+           service returns a raw (headerless) array, the body is streamed
+           directly into a preallocated array, otherwise the response is
+           read from the stream as a .npy file.
+        '''
+        hdrs = dict(headers)
+        hdrs['Accept'] = RAW_NUMPY_TYPE + ', application/octet-stream'
+        r = self._session.post(url, data=data, headers=hdrs, stream=True)
+        try:
+            ctype = r.headers.get('Content-Type', '')
+            if not ctype.startswith(RAW_NUMPY_TYPE) or \
+               'X-Numpy-Dtype' not in r.headers:
+                # A .npy response is read from the stream into the array.
+                r.raw.decode_content = True
+                return np.lib.format.read_array(r.raw, allow_pickle=False)
+
+            return self._stream_into(r,
+                                     _rawDtype(r.headers['X-Numpy-Dtype']),
+                                     _rawShape(r.headers['X-Numpy-Shape']))
+        finally:
+            r.close()                   # return the connection to the pool
+
+    def _read_body(self, r):
+        '''Read a streamed response body into a bytearray, preallocated
+           from the Content-Length when the body is not encoded.
+        '''
+        size = r.headers.get('Content-Length')
+        if size is None or r.headers.get('Content-Encoding'):
+            return bytearray(r.content)
+        buf = bytearray(int(size))
+        mv = memoryview(buf)
+        nread = 0
+        while nread < len(buf):
+            n = r.raw.readinto(mv[nread:])
+            if not n:
+                raise dlSpecError('Short read: got %d of %d bytes' % \
+                                  (nread, len(buf)))
+            nread += n
+        return buf
+
+    def _stream_into(self, r, dtype, shape):
+        '''Read a raw array response body into a preallocated array.
+        '''
+        arr = np.empty(shape, dtype=dtype)
+        buf = memoryview(arr.reshape(-1).view(np.uint8))
+        r.raw.decode_content = True
+        nread = 0
+        while nread < arr.nbytes:
+            n = r.raw.readinto(buf[nread:])
+            if not n:
+                raise dlSpecError('Short read: got %d of %d bytes' % \
+                                  (nread, arr.nbytes))
+            nread += n
+        return arr
+
+    def _setSpan(self, data, headers, context, profile):
+        '''Set the 'w0'/'w1' wavelength span of the ID list in a getSpec
+           payload.  The span of a given list is fixed, so recent results
+           are reused.
+        '''
+        key = (self.svc_url, context, profile,
+               hashlib.blake2b(data['id_list'].encode(),
+                               digest_size=16).digest())
+        v = self._listspan_cache.get(key)
+        if v is None:
+            resp = self._session.post(self._listspan_url, data=data,
+                                      headers=headers)
+            v = _jloads(resp.content)
+            self._listspan_cache[key] = v
+            if len(self._listspan_cache) > LISTSPAN_CACHE_SIZE:
+                self._listspan_cache.popitem(last=False)
+        else:
+            self._listspan_cache.move_to_end(key)
+        data['w0'], data['w1'] = v['w0'], v['w1']
+
+    def _batch_getSpec(self, ids, fmt='numpy', values='all', cutout=None,
+                       context=None, profile=None, token=None):
+        '''Retrieve a list of spectra in a single batched request.  Returns
+           a list in the order of 'ids', or None if the service does not
+           support the batch endpoint.
+        '''
+        headers = self.getHeaders(token)
+        headers['Content-Type'] = 'application/json'
+        payload = {'ids': [_jsonID(i) for i in ids],
+                   'fmt': fmt,
+                   'values': values,
+                   'cutout': str(cutout),
+                   'align': False,
+                   'context': context,
+                   'profile': profile
+                  }
+
+        url = self._getspec_url + '/batch'
+        r = self._session.post(url, data=json.dumps(payload),
+                               headers=headers, stream=True)
+        try:
+            if r.status_code in [404, 405, 415]:
+                return None             # no batch endpoint on this server
+            elif r.status_code != 200:
+                raise dlSpecError('Error %d from batch getSpec: %s' % \
+                                  (r.status_code, spcToString(r.content)))
+            buf = self._read_body(r)
+        finally:
+            r.close()                   # return the connection to the pool
+
+        # Demultiplex the length-prefixed (4-byte big-endian size) payloads.
+        # The arrays are views of the one (writable) response buffer.
+        if fmt.lower() == 'fits':
+            return [bytes(part) for part in _splitFrames(buf)]
+        return [_npyView(part) for part in _splitFrames(buf)]
 
 
     # --------------------------------------------------------------------
@@ -1678,7 +2281,7 @@ class specClient(object):
            isinstance(spec, tuple) or \
            isinstance(spec, str):
                _id = spec
-               dlist = sp_client.getSpec(spec, context=context, profile=profile)
+               dlist = self.getSpec(spec, context=context, profile=profile)
                data = dlist
                wavelength = 10.0**data['loglam']
                flux = data['flux']
@@ -1693,7 +2296,7 @@ class specClient(object):
                    model = spec['model']
                    sky = spec['sky']
                    ivar = spec['ivar']
-            elif isinstance(spec, Spectrum1D):
+            elif _isSpectrum1D(spec):
                 wavelength = np.array(spec.spectral_axis.value)
                 flux = spec.flux
                 model = spec.meta['model']
@@ -1709,7 +2312,7 @@ class specClient(object):
             if _id is not None:
                 # Query for the redshift field of the catalog.
                 headers = self.getHeaders(None)
-                _svc_url = '%s/query?' % self.svc_url      # base service URL
+                _svc_url = self._query_prefix              # base service URL
                 _svc_url += "id=%s&" % str(_id)
                 _svc_url += "fields=%s&" % self.context['redshift']
                 _svc_url += "catalog=%s&" % self.context['catalog']
@@ -1718,7 +2321,7 @@ class specClient(object):
                 _svc_url += "profile=%s&" % profile
                 _svc_url += "debug=%s&" % debug
                 _svc_url += "verbose=%s" % verbose
-                r = requests.get(_svc_url, headers=headers)
+                r = self._session.get(_svc_url, headers=headers)
                 if r.status_code == 200:
                     _val = spcToString(r.content).split('\n')[1:-1][0]
                     z = float(_val)
@@ -1749,7 +2352,73 @@ class specClient(object):
                     rest_frame = True
 
         self._plotSpec(wavelength, flux, model=model, sky=sky, ivar=ivar,
-                       rest_frame=rest_frame, z=z, **kw)
+                       rest_frame=rest_frame, z=z, out=out, **kw)
+
+
+    # --------------------------------------------------------------------
+    # PLOT_MANY -- Plot a list of spectra to output files in parallel.
+    #
+    def plot_many(self, specs, outs, context=None, profile=None,
+                  nthreads=None, **kw):
+
+        '''Plot a list of spectra to output files in parallel.
+
+        Usage:
+            spec.plot_many(specs, outs, context=None, profile=None, **kw)
+
+        Parameters
+        ----------
+        specs: list
+            Spectra to be plotted, each an object ID or data array as
+            accepted by plot().
+
+        outs: list
+            Output filenames, one for each spectrum in 'specs'.
+
+        context: str
+            Dataset context.
+
+        profile: str
+            Data service profile.
+
+        nthreads: int
+            Number of worker threads (def: number of CPUs).
+
+        **kw: dict
+            Optional plot() keyword arguments applied to every spectrum.
+
+        Returns
+        -------
+        result: str
+            Status 'OK' string.
+
+        Example
+        -------
+           1) Plot a list of spectra to PNG files:
+
+            .. code-block:: python
+                outs = ['spec_%d.png' % i for i in range(len(id_list))]
+                spec.plot_many (id_list, outs)
+        '''
+        if len(specs) != len(outs):
+            raise dlSpecError('plot_many(): specs and outs differ in length')
+
+        from matplotlib.figure import Figure
+
+        def _plot_one(spec, out):
+            # Each job draws into a private Figure (rendered with Agg by
+            # savefig) so no global pyplot state is shared between threads.
+            fig = Figure(dpi=100, figsize=(12, 5))
+            try:
+                self.plot(spec, context=context, profile=profile, out=out,
+                          fig=fig, **kw)
+            finally:
+                fig.clear()
+
+        with ThreadPoolExecutor(max_workers=nthreads or os.cpu_count()) as ex:
+            list(ex.map(_plot_one, specs, outs))
+
+        return 'OK'
 
 
     # --------------------------------------------------------------------
@@ -1847,13 +2516,15 @@ class specClient(object):
         if profile in [None, '']:
             profile = self.svc_profile
 
-        url = self.svc_url + '/preview?id=%s' % str(spec)
-        url = url + '&context=%s&profile=%s' % (context, profile)
+        url = self._preview_prefix + \
+              urlencode({'id': spec, 'context': context, 'profile': profile})
         try:
             if USE_CURL:
                 return Image.open(BytesIO(self.curl_get(url)))
             else:
-                return Image.open(BytesIO(requests.get(url, timeout=2).content))
+                # Decode from the response stream as it is read.
+                return self._loadImage(
+                           self._session.get(url, timeout=2, stream=True))
         except Exception as e:
             raise Exception("Error getting plot data: " + str(e))
 
@@ -1920,22 +2591,19 @@ class specClient(object):
             profile = self.svc_profile
 
         # Process optional parameters.
-        token = kw['token'] if 'token' in kw else self.auth_token
-        verbose = kw['verbose'] if 'verbose' in kw else self.verbose
-        debug = kw['debug'] if 'debug' in kw else self.debug
-        fmt = kw['fmt'] if 'fmt' in kw else 'png'
+        token = kw.get('token', self.auth_token)
+        verbose = kw.get('verbose', self.verbose)
+        debug = kw.get('debug', self.debug)
+        fmt = kw.get('fmt', 'png')
 
         # Set service call headers.
-        headers = {'Content-Type': 'application/x-www-form-urlencoded',
-                   'X-DL-ClientVersion': __version__,
-                   'X-DL-OriginIP': self.hostip,
-                   'X-DL-OriginHost': self.hostname,
-                   'X-DL-AuthToken': token}
+        headers = self.getHeaders(token)
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
 
         # Build the query URL string.
-        url = '%s/plotGrid' % self.svc_url
+        url = self._plotgrid_url
 
-        if isinstance(id_list, list) or isinstance(id_list, np.ndarray):
+        if isinstance(id_list, (list, np.ndarray)):
             n_ids = len(id_list)
             sz_grid = nx * ny
             if sz_grid >= n_ids:         # Use the whole list.
@@ -1947,10 +2615,11 @@ class specClient(object):
                 p_end = min(n_ids, p_start + sz_grid)
                 ids = id_list[p_start:p_end]
         else:
-            ids = id_list
+            ids = [id_list]
 
-        # Initialize the payload.
-        data = {'id_list': str(list(ids)),
+        # Initialize the payload.  The ID list is joined directly so that
+        # ndarray slices are not boxed into an intermediate list.
+        data = {'id_list': '[' + ','.join(map(str, ids)) + ']',
                 'ncols': ny,
                 'context': context,
                 'profile': profile,
@@ -1959,11 +2628,16 @@ class specClient(object):
               }
 
 
-        resp = requests.post(url, data=data, headers=headers)
+        resp = self._session.post(url, data=data, headers=headers,
+                                  stream=True)
         if fmt == 'png':
-            return Image.open(BytesIO(resp.content))
+            # Decode from the response stream as it is read.
+            return self._loadImage(resp)
         else:
-            return resp.content
+            try:
+                return resp.content
+            finally:
+                resp.close()
 
 
     # --------------------------------------------------------------------
@@ -2012,34 +2686,38 @@ class specClient(object):
             profile = self.svc_profile
 
         # Process optional parameters.
-        scale = kw['scale'] if 'scale' in kw else (1.0, 1.0)
+        scale = kw.get('scale', (1.0, 1.0))
         if isinstance(scale, float):
             xscale = yscale = scale
         else:
             xscale = scale[0]
             yscale = scale[1]
-        thickness = kw['thickness'] if 'thickness' in kw else 1
-        inverse = kw['inverse'] if 'inverse' in kw else False
-        cmap = kw['cmap'] if 'cmap' in kw else 'gray'
-        width = kw['width'] if 'width' in kw else 0
-        height = kw['height'] if 'height' in kw else 0
-        token = kw['token'] if 'token' in kw else self.auth_token
-        verbose = kw['verbose'] if 'verbose' in kw else self.verbose
-        debug = kw['debug'] if 'debug' in kw else self.debug
-        fmt = kw['fmt'] if 'fmt' in kw else 'png'
+        thickness = kw.get('thickness', 1)
+        inverse = kw.get('inverse', False)
+        cmap = kw.get('cmap', 'gray')
+        width = kw.get('width', 0)
+        height = kw.get('height', 0)
+        token = kw.get('token', self.auth_token)
+        verbose = kw.get('verbose', self.verbose)
+        debug = kw.get('debug', self.debug)
+        fmt = kw.get('fmt', 'png')
 
         # Set service call headers.
-        headers = {'Content-Type': 'application/x-www-form-urlencoded',
-                   'X-DL-ClientVersion': __version__,
-                   'X-DL-OriginIP': self.hostip,
-                   'X-DL-OriginHost': self.hostname,
-                   'X-DL-AuthToken': token}
+        headers = self.getHeaders(token)
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
 
         # Build the query URL string.
-        url = '%s/stackedImage' % self.svc_url
+        url = self._stackedimage_url
 
-        # Initialize the payload.
-        data = {'id_list': str(list(id_list)),
+        # Initialize the payload.  Lists are used as-is; arrays are
+        # converted with tolist() so elements format as plain ints.
+        if isinstance(id_list, list):
+            ids = id_list
+        elif hasattr(id_list, 'tolist'):
+            ids = id_list.tolist()
+        else:
+            ids = list(id_list)
+        data = {'id_list': str(ids),
                 'context': context,
                 'xscale': xscale,
                 'yscale': yscale,
@@ -2053,11 +2731,16 @@ class specClient(object):
                 'verbose': verbose
               }
 
-        resp = requests.post(url, data=data, headers=headers)
+        resp = self._session.post(url, data=data, headers=headers,
+                                  stream=True)
         if fmt == 'png':
-            return Image.open(BytesIO(resp.content))
+            # Decode from the response stream as it is read.
+            return self._loadImage(resp)
         else:
-            return resp.content
+            try:
+                return resp.content
+            finally:
+                resp.close()
 
 
     ###################################################
@@ -2070,7 +2753,8 @@ class specClient(object):
     @staticmethod
     def _plotSpec(wavelength, flux, model=None, sky=None, ivar=None,
                   rest_frame=True, z=0.0, xlim=None, ylim=None,
-                  title=None, xlabel=None, ylabel=None, out=None, **kw):
+                  title=None, xlabel=None, ylabel=None, out=None, fig=None,
+                  ax=None, **kw):
         """Plot a spectrum.
 
         Inputs:
@@ -2093,6 +2777,11 @@ class specClient(object):
             * xlabel - Plot x-axis label (def: wavelength)
             * ylabel - Plot y-axis label (def: flux units)
             * out - Saved output filename.
+            * fig - Figure to draw into.  If None, a new pyplot figure is
+                    created.  Passing a private Figure keeps the plot out
+                    of the global pyplot state (e.g. for threaded use).
+            * ax - Axes to draw into (e.g. one panel of a caller's grid).
+                   If given, 'fig' is taken from the Axes.
 
         Optional kwargs:
             * values - A comma-delimited string of which values to plot, a
@@ -2120,119 +2809,132 @@ class specClient(object):
                          'Redshift required to mark lines in observed frame')
                 return
 
-            for ii in range(len(lines)):
-                # If rest_frame=False, shift lines to the observed frame.
-                lam = lines[ii]['lambda']
-                if rest_frame is False:
-                    lam = lam * (1+z)
-                # Plot only lines within the x-range of the plot.
-                if ((lam > xbounds[0]) & (lam < xbounds[1])):
-                    ax.axvline(lam, color=color, lw=1.0, linestyle=':')
-                    ax.annotate(lines[ii]['label'], xy=(lam, yloc),
-                                xycoords=ax.get_xaxis_transform(),
-                                fontsize=12, rotation=90, color=color)
+            # If rest_frame=False, shift lines to the observed frame.
+            shift = (1 + z) if rest_frame is False else 1.0
+            _placeLabels(_labelPositions(lines[0], lines[1], shift, xbounds),
+                         ax, color, yloc)
 
         # Process the optional kwargs.
-        dark = kw['dark'] if 'dark' in kw else True
-        grid = kw['grid'] if 'grid' in kw else True
-        mark_lines = kw['mark_lines'] if 'mark_lines' in kw else 'all'
-        em_lines = kw['em_lines'] if 'em_lines' in kw else None
-        abs_lines = kw['abs_lines'] if 'abs_lines' in kw else None
-        values = kw['values'] if 'values' in kw else 'flux,model'
-
-        if 'spec_args' in kw:
-            spec_args = kw['spec_args']
-        else:
-            spec_args = {'color': '#ababab', 'linewidth': 1.0, 'alpha': 1.0}
-        if 'model_args' in kw:
-            model_args = kw['model_args']
-        else:
-            model_args = {'color': 'red', 'linewidth': 1.2}
-        if 'sky_args' in kw:
-            sky_args = kw['sky_args']
-        else:
-            sky_args = {'color': 'brown', 'linewidth': 1.0}
-        if 'ivar_args' in kw:
-            ivar_args = kw['ivar_args']
-        else:
-            ivar_args = {'color': 'blue', 'linewidth': 1.0}
-
-        # Setting up the plot
-        if dark:
-            fig = plt.figure(dpi=100, figsize=(12, 5), facecolor='#2F4F4F')
-            plt.rcParams['axes.facecolor'] = '#121212'
-            plt.rcParams['axes.edgecolor'] = '#00FFFF'
-        else:
+        p = {**_PLOTSPEC_DEFAULTS, **kw}
+        dark = p['dark']
+        grid = p['grid']
+        mark_lines = (p['mark_lines'] or '').lower()
+        em_lines = p['em_lines']
+        abs_lines = p['abs_lines']
+        values = frozenset(v.strip() for v in p['values'].split(','))
+        spec_args = p['spec_args']
+        model_args = p['model_args']
+        sky_args = p['sky_args']
+        ivar_args = p['ivar_args']
+
+        # Fast path for a bare flux plot with no line marks, grid, labels
+        # or legend to build.
+        if values == {'flux'} and not mark_lines and \
+           not grid and not dark and title in [None, ''] and \
+           xlabel is None and ylabel is None:
+            return specClient._plotFluxFast(wavelength, flux, ivar=ivar,
+                                            xlim=xlim, ylim=ylim, out=out,
+                                            fig=fig, ax=ax,
+                                            spec_args=spec_args)
+
+        from matplotlib import pyplot as plt
+        from matplotlib import colors as mcolors
+        from matplotlib.collections import LineCollection
+        from matplotlib.lines import Line2D
+
+        # Setting up the plot.  Figures created here through pyplot are
+        # closed once saved so they do not accumulate in its manager.
+        own_fig = False
+        if ax is not None:
+            fig = ax.figure
+        elif fig is None:
             fig = plt.figure(dpi=100, figsize=(12, 5))
-            plt.rcParams['axes.facecolor'] = '#FFFFFF'
+            own_fig = True
 
-        ax = fig.add_subplot(111)
+        # Collect the requested bands and draw them as a single collection.
+        # Values are masked wherever the ivar is zero.
+        bands = []
         if 'flux' in values:
-            if ivar is None:
-                ax.plot(wavelength, flux, label='Flux', **spec_args)
-            else:
-                ax.plot(wavelength, flux * (ivar > 0), label='Flux',
-                        **spec_args)
+            bands.append((flux, 'Flux', spec_args))
         if 'model' in values and model is not None:
-            if ivar is None:
-                ax.plot(wavelength, model, label='Model', **model_args)
-            else:
-                ax.plot(wavelength, model * (ivar > 0), label='Model',
-                        **model_args)
+            bands.append((model, 'Model', model_args))
         if 'sky' in values and sky is not None and ivar is not None:
-            if ivar is None:
-                ax.plot(wavelength, sky, label='Sky', **model_args)
-            else:
-                ax.plot(wavelength, sky * (ivar > 0), label='Sky', **sky_args)
+            bands.append((sky, 'Sky', sky_args))
         if 'ivar' in values and ivar is not None:
-            ax.plot(wavelength, ivar * (ivar > 0), label='Ivar', **ivar_args)
+            bands.append((ivar, 'Ivar', ivar_args))
 
-        plt.xlim(xlim)
-        plt.ylim(ylim)
+        if ax is None:
+            ax = fig.add_subplot(111)
+        if dark:
+            fig.set_facecolor('#2F4F4F')
+            ax.set_facecolor('#121212')
+            for spine in ax.spines.values():
+                spine.set_edgecolor('#00FFFF')
+        else:
+            ax.set_facecolor('#FFFFFF')
+
+        handles = []
+        if len(bands) > 0:
+            # Fill the segment array in place, masking each band by the
+            # ivar as it is copied.
+            wave = np.asarray(wavelength)
+            segs = np.empty((len(bands), len(wave), 2))
+            segs[:, :, 0] = wave
+            _maskBands(ivar, [b[0] for b in bands], segs[:, :, 1])
+
+            colors, widths, styles = [], [], []
+            for _, label, args in bands:
+                colors.append(mcolors.to_rgba(args.get('color', 'C0'),
+                                              args.get('alpha', None)))
+                widths.append(args.get('linewidth', 1.0))
+                styles.append(args.get('linestyle', 'solid'))
+                handles.append(Line2D([], [], color=colors[-1],
+                                      linewidth=widths[-1],
+                                      linestyle=styles[-1], label=label))
+            ax.add_collection(LineCollection(segs, colors=colors,
+                                             linewidths=widths,
+                                             linestyles=styles))
+            ax.autoscale_view()
+
+        if xlim is not None:
+            ax.set_xlim(xlim)
+        if ylim is not None:
+            ax.set_ylim(ylim)
         am_color = ('#00FF00' if dark else 'black')
         if ylabel is None:
             if rest_frame:
-                plt.xlabel('Rest Wavelength ($\AA$)', color=am_color)
+                ax.set_xlabel('Rest Wavelength ($\AA$)', color=am_color)
             else:
                 if z is not None:
-                    plt.xlabel('Observed Wavelength ($\AA$)    z=%.3g' % z,
-                               color=am_color)
+                    ax.set_xlabel('Observed Wavelength ($\AA$)    z=%.3g' % z,
+                                  color=am_color)
                 else:
-                    plt.xlabel('Observed Wavelength ($\AA$)    z=(unknown)',
-                               color=am_color)
+                    ax.set_xlabel('Observed Wavelength ($\AA$)    z=(unknown)',
+                                  color=am_color)
         else:
-            plt.xlabel(xlabel, color=am_color)
+            ax.set_xlabel(xlabel, color=am_color)
         if ylabel is None:
             ylab = '$F_{\lambda}$ ($10^{-17}~ergs~s^{-1}~cm^{-2}~\AA^{-1}$)'
-            plt.ylabel(ylab, color=am_color)
+            ax.set_ylabel(ylab, color=am_color)
         else:
-            plt.ylabel(ylabel, color=am_color)
+            ax.set_ylabel(ylabel, color=am_color)
 
         if dark:
             ax.tick_params(color='cyan', labelcolor='yellow')
         if grid:
-            plt.grid(color='gray', linestyle='dashdot', linewidth=0.5)
+            ax.grid(color='gray', linestyle='dashdot', linewidth=0.5)
 
         if title not in [None, '']:
             ax.set_title(title, c=am_color)
 
         # Plotting Absorption/Emission lines - only works if either of the
         # lines is set to True
-        if mark_lines not in [None, '']:
-            if mark_lines.lower() in ['all', 'both']:
-                opt = 'ea'
-            else:
-                opt = mark_lines.lower()
+        if mark_lines:
+            opt = 'ea' if mark_lines in ('all', 'both') else mark_lines
 
             # Select any lines listed by the user.
-            e_lines = _em_lines
-            if em_lines is not None:
-                e_lines = list(filter(lambda x: x['name'] in em_lines,
-                               _em_lines))
-            a_lines = _abs_lines
-            if abs_lines is not None:
-                a_lines = list(filter(lambda x: x['name'] in abs_lines,
-                               _abs_lines))
+            e_lines = _selectLines('em', em_lines)
+            a_lines = _selectLines('abs', abs_lines)
             xbounds = ax.get_xbound()   # Getting the x-range of the plot
 
             lcol = ['#FFFF00', '#00FFFF'] if dark else ['#FF0000', '#0000FF']
@@ -2241,13 +2943,51 @@ class specClient(object):
             if 'a' in opt:
                 labelLines(a_lines, ax, lcol[1], 0.05)
 
-        leg = ax.legend()
+        leg = ax.legend(handles=handles)
         if dark:
             for text in leg.get_texts():
-                plt.setp(text, color='w')
+                text.set_color('w')
+
+        if out is not None:
+            _saveFig(fig, out)
+            if own_fig:
+                plt.close(fig)
+        else:
+            plt.show()
+
+    # --------------------------------------------------------------------
+    # _PLOTFLUXFAST -- Plot only the (masked) flux of a spectrum.
+    #
+    @staticmethod
+    def _plotFluxFast(wavelength, flux, ivar=None, xlim=None, ylim=None,
+                      out=None, fig=None, ax=None, spec_args=None):
+        '''Plot only the (masked) flux of a spectrum, skipping the legend,
+           axis labels, tick styling and line marking of _plotSpec().
+        '''
+        from matplotlib import pyplot as plt
+
+        own_fig = False
+        if ax is not None:
+            fig = ax.figure
+        else:
+            if fig is None:
+                fig = plt.figure(dpi=100, figsize=(12, 5))
+                own_fig = True
+            ax = fig.add_subplot(111)
+
+        wave = np.asarray(wavelength)
+        yval = np.empty((1, len(wave)))
+        _maskBands(ivar, [flux], yval)
+        ax.plot(wave, yval[0], **(spec_args or {}))
+        if xlim is not None:
+            ax.set_xlim(xlim)
+        if ylim is not None:
+            ax.set_ylim(ylim)
 
         if out is not None:
-            plt.savefig(out)
+            _saveFig(fig, out)
+            if own_fig:
+                plt.close(fig)
         else:
             plt.show()
 
@@ -2263,58 +3003,123 @@ class specClient(object):
     def retBoolValue(self, url):
         '''Utility method to call a boolean service at the given URL.
         '''
-        response = ""
+        # Add the auth token to the request header.
+        headers = None
+        if self.auth_token is not None:
+            headers = {'X-DL-AuthToken': self.auth_token}
+
+        # Read the body incrementally rather than materializing '.content'.
+        # The response string is returned for both success and error.
+        r = self._session.get(url, headers=headers, stream=True)
+        data = bytearray()
+        try:
+            for chunk in r.iter_content(chunk_size=STREAM_CHUNK):
+                data.extend(chunk)
+        finally:
+            r.close()
+        return spcToString(bytes(data))
+
+    def _loadImage(self, r):
+        '''Utility method to decode an image from a streamed response as
+           it is read.  The response is closed, returning its connection
+           to the pool, and an error reply raises rather than reaching PIL.
+        '''
         try:
-            # Add the auth token to the reauest header.
-            if self.auth_token != None:
-                headers = {'X-DL-AuthToken': self.auth_token}
-                r = requests.get(url, headers=headers)
-            else:
-                r = requests.get(url)
-            response = spcToString(r.content)
-
             if r.status_code != 200:
-                raise Exception(r.content)
+                raise dlSpecError('Error %d getting image: %s' % \
+                                  (r.status_code, spcToString(r.content)))
+            r.raw.decode_content = True
+            img = Image.open(r.raw)
+            img.load()
+            return img
+        finally:
+            r.close()
+
+    def _validate(self, what, value):
+        '''Validate a profile/context value with the service.  Successful
+           validations are remembered for the lifetime of the client.
+        '''
+        key = (self.svc_url, what, value)
+        if key in self._validate_cache:
+            return True
 
-        except Exception:
-            return spcToString(r.content)
-        else:
-            return response
+        url = f'{self._validate_prefix}{what}&value={value}'
+        if spcToString(self.curl_get(url)) == 'OK':
+            self._validate_cache.add(key)
+            return True
+        return False
 
     def getHeaders(self, token):
-        '''Get default tracking headers.
+        '''Get default tracking headers.  The token is resolved on each
+           call so a later login is picked up; only the header dict built
+           for a given token string is cached.
         '''
         tok = def_token(token)
-        user, uid, gid, hash = tok.strip().split('.', 3)
-        hdrs = {'Content-Type': 'text/ascii',
-                'X-DL-ClientVersion': __version__,
-                'X-DL-OriginIP': self.hostip,
-                'X-DL-OriginHost': self.hostname,
-                'X-DL-User': user,
-                'X-DL-AuthToken': tok}
-        return hdrs
+        hdrs = self._hdr_cache.get(tok)
+        if hdrs is None:
+            # Token is of the form 'user.uid.gid.hash'.
+            hdrs = self._base_hdrs.copy()
+            hdrs['X-DL-OriginIP'] = self.hostip
+            hdrs['X-DL-OriginHost'] = self.hostname
+            hdrs['X-DL-User'] = tok.strip().split('.', 1)[0]
+            hdrs['X-DL-AuthToken'] = tok
+            self._hdr_cache[tok] = hdrs
+
+        # Callers add per-request headers, so hand back a copy.
+        return hdrs.copy()
 
     def getFromURL(self, svc_url, path, token):
         '''Get something from a URL.  Return a 'response' object.
         '''
         try:
-            hdrs = self.getHeaders(token)
-            resp = requests.get("%s%s" % (svc_url, path), headers=hdrs)
+            resp = self._session.get(f"{svc_url}{path}",
+                                     headers=self.getHeaders(token))
 
         except Exception as e:
             raise dlSpecError(str(e))
         return resp
 
     def curl_get(self, url):
-        '''Utility routine to use cURL to return a URL
+        '''Utility routine to use cURL to return a URL.  The body is written
+           into a bytearray preallocated from the Content-Length header
+           (when given) and returned.
         '''
-        b_obj = BytesIO()
-        crl = pycurl.Curl()
-        crl.setopt(crl.URL, url)
-        crl.setopt(crl.WRITEDATA, b_obj)
-        crl.perform()
-        crl.close()
-        return b_obj.getvalue()
+        state = {'buf': None, 'off': 0}
+
+        def _header(line):
+            if line.startswith(b'HTTP/'):
+                state['buf'], state['off'] = None, 0    # new response
+            elif line[:15].lower() == b'content-length:':
+                state['buf'] = bytearray(int(line[15:].strip()))
+
+        def _write(chunk):
+            buf, off, n = state['buf'], state['off'], len(chunk)
+            if buf is None:
+                buf = state['buf'] = bytearray()
+            buf[off:off+n] = chunk
+            state['off'] = off + n
+
+        with self._curl_lock:
+            self._curl.setopt(pycurl.URL, url)
+            self._curl.setopt(pycurl.HEADERFUNCTION, _header)
+            self._curl.setopt(pycurl.WRITEFUNCTION, _write)
+            self._curl.perform()
+
+        buf = state['buf'] if state['buf'] is not None else bytearray()
+        del buf[state['off']:]
+        return buf
+
+    def _parseIDText(self, text):
+        '''Parse a newline-separated list of identifiers.  Integer IDs are
+           converted directly by numpy, raising a ValueError that names a
+           malformed line; '(plate,mjd,fiber)' tuples are returned as
+           strings without the parentheses.
+        '''
+        text = spcToString(text)
+        if text.lstrip().startswith('('):
+            return np.array([l.strip()[1:-1] for l in text.splitlines()
+                             if l.strip() != ''])
+        return np.array(text.split(), dtype=np.uint64)
 
     def extractIDList(self, id_list, id_col=None):
         '''Extract a 1-D array or single identifier from an input ID type.
@@ -2327,12 +3132,11 @@ class specClient(object):
                 with open(id_list, 'r') as fd:
                     _list = fd.read()
                 if _list.startswith(self.context['id_main']):   # CSV string?
-                    ids = _list.split('\n')[1:-1]
-                else:
-                    ids = _list.split('\n')[:-1]
+                    _list = _list.partition('\n')[2]
+                return self._parseIDText(_list)
             elif id_list.startswith('vos://'):
                 # Read list from virtual storage.
-                ids = storeClient.get(id_list).split('\n')[:-1]
+                return self._parseIDText(storeClient.get(id_list))
             elif id_list.find(',') > 0 or \
                  id_list.startswith(self.context['id_main']):   # CSV string?
                      pdata = convert(id_list, outfmt='pandas')
@@ -2394,6 +3198,80 @@ class specClient(object):
         return ids
 
 
+# ###################################
+#  Spectrum Overlay Plotter
+# ###################################
+
+class SpecPlotter(object):
+    '''
+         SPECPLOTTER -- Plot a baseline spectrum once and redraw only an
+                        overlay line (e.g. a model fit or sky template) on
+                        each update.  The rendered background is cached and
+                        restored so axes, ticks and labels are not redrawn.
+    '''
+
+    def __init__(self, wavelength, flux, xlim=None, ylim=None, dark=True,
+                 out=None, spec_args=None, overlay_args=None):
+
+        '''Initialize the plotter with the baseline spectrum.  If 'out' is
+           given, each update() is saved to that file rather than blitted.
+        '''
+        from matplotlib import pyplot as plt
+
+        if spec_args is None:
+            spec_args = {'color': '#ababab', 'linewidth': 1.0, 'alpha': 1.0}
+        if overlay_args is None:
+            overlay_args = {'color': 'red', 'linewidth': 1.2}
+
+        self.wavelength = np.asarray(wavelength)
+        self.out = out
+
+        if dark:
+            self.fig = plt.figure(dpi=100, figsize=(12, 5),
+                                  facecolor='#2F4F4F')
+        else:
+            self.fig = plt.figure(dpi=100, figsize=(12, 5))
+        self.ax = self.fig.add_subplot(111)
+        if dark:
+            self.ax.set_facecolor('#121212')
+            self.ax.tick_params(color='cyan', labelcolor='yellow')
+
+        self.ax.plot(self.wavelength, np.asarray(flux), **spec_args)
+        if xlim is not None:
+            self.ax.set_xlim(xlim)
+        if ylim is not None:
+            self.ax.set_ylim(ylim)
+
+        # The overlay is excluded from the cached background when blitting.
+        self.line, = self.ax.plot([], [], animated=(out is None),
+                                  **overlay_args)
+        self.fig.canvas.draw()
+        if out is None:
+            self.bg = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        else:
+            self.bg = None
+
+    def update(self, overlay):
+        '''Replace the overlay values and redraw only the overlay line.
+        '''
+        self.line.set_data(self.wavelength, np.asarray(overlay))
+        if self.bg is None:
+            _saveFig(self.fig, self.out)
+            return
+
+        canvas = self.fig.canvas
+        canvas.restore_region(self.bg)
+        self.ax.draw_artist(self.line)
+        canvas.blit(self.ax.bbox)
+        canvas.flush_events()
+
+    def close(self):
+        '''Release the plot figure.
+        '''
+        from matplotlib import pyplot as plt
+        plt.close(self.fig)
+
+
 # ###################################
 #  Spectroscopic Data Client Handles
 # ###################################
@@ -2422,20 +3300,32 @@ def getClient(context='default', profile='default'):
     return specClient(context=context, profile=profile)
 
 
-# Get the default client object.
-sp_client = client = getClient(context='default', profile='default')
+@functools.lru_cache(maxsize=None)
+def _defaultClient():
+    '''Get the default client object used by the module-level functions.
+       It is created on first use rather than at import time.
+    '''
+    return getClient(context='default', profile='default')
+
+
+def __getattr__(name):
+    '''Create the default 'sp_client' (or 'client') object on first access.
+    '''
+    if name in ('sp_client', 'client'):
+        return _defaultClient()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ##########################################
 #  Patch the docstrings for module functions
 # ##########################################
 
-set_svc_url.__doc__ = sp_client.set_svc_url.__doc__
-get_svc_url.__doc__ = sp_client.get_svc_url.__doc__
-set_profile.__doc__ = sp_client.set_profile.__doc__
-get_profile.__doc__ = sp_client.get_profile.__doc__
-set_context.__doc__ = sp_client.set_context.__doc__
-get_context.__doc__ = sp_client.get_context.__doc__
+set_svc_url.__doc__ = specClient.set_svc_url.__doc__
+get_svc_url.__doc__ = specClient.get_svc_url.__doc__
+set_profile.__doc__ = specClient.set_profile.__doc__
+get_profile.__doc__ = specClient.get_profile.__doc__
+set_context.__doc__ = specClient.set_context.__doc__
+get_context.__doc__ = specClient.get_context.__doc__
 
 
 # Define a set of spectral lines.
@@ -2502,15 +3392,154 @@ _abs_lines = [
 ]
 
 
+# Struct-of-arrays form of the line lists so the visible-range filter
+# is a single vectorized mask rather than a loop over dicts.
+_em_names = np.array([l['name'] for l in _em_lines])
+_em_lambda = np.array([l['lambda'] for l in _em_lines], dtype=np.float64)
+_em_label = np.array([l['label'] for l in _em_lines], dtype=object)
+
+_abs_names = np.array([l['name'] for l in _abs_lines])
+_abs_lambda = np.array([l['lambda'] for l in _abs_lines], dtype=np.float64)
+_abs_label = np.array([l['label'] for l in _abs_lines], dtype=object)
+
+_line_tables = {'em': (_em_names, _em_lambda, _em_label),
+                'abs': (_abs_names, _abs_lambda, _abs_label)}
+
+# Cache of user-selected line subsets, keyed by the table and the set of
+# requested line names.
+_line_filter_cache = {}
+_LINE_FILTER_CACHE_SIZE = 64
+
+
+# --------------------------------------------------------------------
+# _SELECTLINES -- Get the (lambda, label) arrays of the named lines.
+#
+def _selectLines(table, names):
+    '''Return the (lambda, label) arrays of the lines in the 'em' or 'abs'
+       table whose names are listed, or of every line if names is None.
+    '''
+    all_names, lam, label = _line_tables[table]
+    if names is None:
+        return (lam, label)
+
+    key = (table, frozenset([names] if isinstance(names, str) else names))
+    sel = _line_filter_cache.get(key)
+    if sel is None:
+        mask = np.isin(all_names, list(key[1]))
+        sel = (lam[mask], label[mask])
+        if len(_line_filter_cache) >= _LINE_FILTER_CACHE_SIZE:
+            _line_filter_cache.clear()
+        _line_filter_cache[key] = sel
+    return sel
+
+
+# --------------------------------------------------------------------
+# _LABELPOSITIONS -- Get the (lambda, label) pairs visible in a plot range.
+#
+def _labelPositions(lam, label, shift, xbounds):
+    '''Return the (lambda, label) pairs of the lines that fall within the
+       x-range of the plot once shifted by the given factor.
+    '''
+    if shift != 1.0:
+        lam = lam * shift
+    idx = np.nonzero((lam > xbounds[0]) & (lam < xbounds[1]))[0]
+    return list(zip(lam[idx].tolist(), label[idx].tolist()))
+
+
+# --------------------------------------------------------------------
+# _PLACELABELS -- Mark and annotate precomputed line positions on a plot.
+#
+def _placeLabels(pos, ax, color, yloc):
+    '''Mark and annotate precomputed line positions on a plot.
+    '''
+    xform = ax.get_xaxis_transform()
+    for lam, label in pos:
+        ax.axvline(lam, color=color, lw=1.0, linestyle=':')
+        ax.annotate(label, xy=(lam, yloc), xycoords=xform,
+                    fontsize=12, rotation=90, color=color)
+
+
+# --------------------------------------------------------------------
+# _ISSPECTRUM1D -- Test for a Spectrum1D object without importing specutils.
+#
+def _isSpectrum1D(obj):
+    '''_isSpectrum1D -- Test for a Spectrum1D object without importing
+                        specutils (which must already be loaded if the
+                        object is one).
+    '''
+    mod = sys.modules.get('specutils')
+    return mod is not None and isinstance(obj, mod.Spectrum1D)
+
+
+# --------------------------------------------------------------------
+# _SAVEFIG -- Render a figure in memory and write it to a file or VOS.
+#
+def _saveFig(fig, out):
+    '''Render a figure to an in-memory buffer and write the bytes to the
+       named local file or 'vos://' URI in a single call.  The full figure
+       bbox is passed explicitly so a 'savefig.bbox=tight' user setting
+       does not force an extra layout/render pass.
+    '''
+    fmt = os.path.splitext(out)[1][1:].lower() or 'png'
+    buf = BytesIO()
+    fig.savefig(buf, format=fmt, bbox_inches=fig.bbox_inches)
+
+    if out.startswith('vos://'):
+        with tempfile.NamedTemporaryFile(suffix='.' + fmt) as fd:
+            fd.write(buf.getbuffer())
+            fd.flush()
+            storeClient.put(fr=fd.name, to=out, verbose=False)
+    else:
+        with open(out, 'wb') as fd:
+            fd.write(buf.getbuffer())
+
+
+# --------------------------------------------------------------------
+# _MASKBANDS -- Copy spectrum bands into an output array, masked by ivar.
+#
+def _maskBands(ivar, bands, out):
+    '''Copy each band into a row of 'out', setting the values to NaN where
+       the ivar is not positive so matplotlib leaves a gap rather than
+       drawing to zero.  Numba is used when available, otherwise the mask
+       is computed once and applied to each band without temporaries.
+    '''
+    if ivar is None:
+        for j, y in enumerate(bands):
+            out[j] = np.asarray(y)
+    elif HAVE_NUMBA:
+        ivar = np.asarray(ivar)
+        for j, y in enumerate(bands):
+            _maskBandNumba(ivar, np.asarray(y), out[j])
+    else:
+        mask = np.asarray(ivar) > 0
+        out[:] = np.nan
+        for j, y in enumerate(bands):
+            np.copyto(out[j], np.asarray(y), where=mask)
+    return out
+
+
+if HAVE_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _maskBandNumba(ivar, y, out):
+        '''Fused mask-and-copy of a single band.
+        '''
+        for i in prange(ivar.shape[0]):
+            out[i] = y[i] if ivar[i] > 0.0 else np.nan
+
+
 def airtovac(l):
     '''Convert air wavelengths (greater than 2000A) to vacuum wavelengths.
+       'l' may be a scalar or an array; wavelengths below 2000A are
+       returned unchanged.
     '''
-    if l < 2000.0:
-        return l
-    vac = l
-    for iter in range(2):
-        sigma2 = (1.0e4 / vac) * (1.0e4 / vac)
-        fact = 1.0 + 5.792105e-2 / (238.0185 - sigma2) + \
-            1.67917e-3 / (57.362 - sigma2)
-        vac = l * fact
-    return vac
+    lam = np.asarray(l, dtype=np.float64)
+    vac = lam.copy()
+    with np.errstate(divide='ignore', invalid='ignore'):  # masked below
+        for iter in range(2):
+            sigma2 = 1.0e4 / vac
+            sigma2 *= sigma2
+            fact = 1.0 + 5.792105e-2 / (238.0185 - sigma2) + \
+                1.67917e-3 / (57.362 - sigma2)
+            vac = lam * fact
+    vac = np.where(lam < 2000.0, lam, vac)
+    return vac.item() if vac.ndim == 0 else vac
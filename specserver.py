@@ -41,22 +41,33 @@ except:
 
 
 import os
-import sys
 import json
 import argparse
 import asyncio
 import socket
 import logging
 
+try:
+    import orjson                               # fast JSON parsing
+    _jloads = orjson.loads
+except ImportError:
+    _jloads = json.loads
+
 from aiohttp import web
 
-# Import the Async implementation
-from svr_async import app as svr_async_app
-from svr_async import routes as async_routes
+try:
+    import uvloop                               # libuv-based event loop
+    HAVE_UVLOOP = True
+except ImportError:
+    HAVE_UVLOOP = False
+
+# The async (aiohttp) and sync (flask) implementations are imported only
+# when the server is started, so only the framework in use is loaded.
 
 config = {}			# Global configuration data
 
-is_py3 = sys.version_info.major == 3
+# Simple host name, looked up once rather than on each config (re)load.
+_HOSTNAME = socket.gethostname().split('.')[0]
 
 
 # Default config file
@@ -75,14 +86,12 @@ def parseConfig(file):
 
     print('Opening config file: ' + file)
     if os.path.exists(file):
-        config = json.load(open(file))
-        if is_py3:
-            profiles = list(config['profiles'].keys())    # Py3 version
-        else:
-            profiles = config['profiles'].keys()          # Py2 version
+        with open(file, 'rb') as fd:
+            config = _jloads(fd.read())
+        profiles = list(config['profiles'].keys())
 
         def_profile = 'default'
-        this_host = socket.gethostname().split('.')[0]    # simple host name
+        this_host = _HOSTNAME
         if this_host in profiles:
             def_profile = this_host
             cfg = config['profiles'][def_profile]
@@ -125,6 +134,7 @@ def main():
         raise Exception('No config file found.')
 
     if parsed.sync:
+        from svr_sync import app as svr_sync
         print("Starting Flask server")
         svr_sync.run(
             host=parsed.host,
@@ -132,27 +142,36 @@ def main():
             threaded=True
         )
     else:
+        from svr_async import app as svr_async_app
+
         async def start_async_server():
             runner = web.AppRunner(svr_async_app)
             await runner.setup()
-            site = web.TCPSite(
-                runner, parsed.host, parsed.port)
-            await site.start()
-            print(f"Serving up app on {parsed.host}:{parsed.port}")
-            return runner, site
+            try:
+                site = web.TCPSite(
+                    runner, parsed.host, parsed.port, backlog=2048)
+                await site.start()
+                print(f"Serving up app on {parsed.host}:{parsed.port}")
+                await asyncio.Event().wait()        # serve until cancelled
+            finally:
+                await runner.cleanup()
 
         print("Starting async server")
-        loop = asyncio.get_event_loop()
-        runner, site = loop.run_until_complete(start_async_server())
+        if HAVE_UVLOOP:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
         try:
-            loop.run_forever()
+            asyncio.run(start_async_server())
         except KeyboardInterrupt:
-            loop.run_until_complete(runner.cleanup())
+            pass
 
 async def specserverFactory():
+    from svr_async import routes as async_routes
+    from svr_async import _initIOExecutor
+
     logging.basicConfig(level=logging.INFO)
     app = web.Application(client_max_size=4096**2)
     app.add_routes(async_routes)
+    app.on_startup.append(_initIOExecutor)
     return app
 
 
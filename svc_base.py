@@ -5,6 +5,10 @@
 __authors__ = 'Mike Fitzpatrick <fitz@noao.edu>'
 __version__ = 'v1.0.0'
 
+import os
+import mmap
+import asyncio
+
 
 # Base service class.
 class Service(object):
@@ -24,6 +28,11 @@ class Service(object):
         '''
         pass
 
+    def dataPaths(self, ids, fmt=None):
+        '''Return the paths to the spectrum data files for a list of IDs.
+        '''
+        return [self.dataPath(id, fmt) for id in ids]
+
     def previewPath(self, id):
         '''Return the path to the spectrum preview plot.
         '''
@@ -41,8 +50,27 @@ class Service(object):
         pass
 
     def readFile(self, fname):
-        '''Return the bytes in the named file.
+        '''Return the bytes in the named file.  The file is memory-mapped
+           and a read-only memoryview returned, so the contents are paged
+           in by the kernel rather than copied into a new bytes object.
+           The mapping is released when the view is no longer referenced.
         '''
         with open(fname, 'rb') as fd:
-            _bytes = fd.read()
-        return _bytes
+            if os.fstat(fd.fileno()).st_size == 0:
+                return b''                      # empty files can't be mapped
+            mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mm)
+
+    async def readFileAsync(self, fname):
+        '''Read the named file in the loop's default executor so the event
+           loop is not blocked.  See readFile().
+        '''
+        return await asyncio.get_running_loop().run_in_executor(
+                                                None, self.readFile, fname)
+
+    async def getDataAsync(self, fname):
+        '''Load the named data file in the loop's default executor.  See
+           getData().
+        '''
+        return await asyncio.get_running_loop().run_in_executor(
+                                                None, self.getData, fname)
@@ -10,6 +10,8 @@ import os
 import glob
 import re
 import time
+import functools
+import collections
 #import logging
 import numpy as np
 from svc_base import Service
@@ -20,6 +22,12 @@ from io import StringIO
 
 from dl import queryClient as qc
 
+try:
+    from numba import njit, prange              # optional JIT kernels
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
 
 # Primary object identifier
 sdss_id_main = 'specobjid'
@@ -38,6 +46,9 @@ sdss_run2d = {'dr16': [26, 103, 104, 'v5_13_0'],
 
 DEF_QUERY_PROFILE = 'db01'
 
+# Maximum number of cached ID -> file path lookups per service.
+PATH_CACHE_SIZE = 65536
+
 
 # SDSS data service sub-class.
 class sdssService(Service):
@@ -50,12 +61,19 @@ class sdssService(Service):
         self.cache_root = '/ssd0/sdss/'                   # Root to cached data
         self.data_root = '%s/sdss/spectro/redux/' % release
 
+        # Per-release path prefixes of the FITS and cached data.
+        self._fits_prefix = self.fits_root + release + '/'
+        self._cache_prefix = self.cache_root + release + '/'
+
         self.run2d = sdss_run2d[release]
         self.query_profile = DEF_QUERY_PROFILE
 
         self.debug = False
         self.verbose = False
 
+        # Resolved file paths keyed by (id, extn), in LRU order.
+        self._path_cache = collections.OrderedDict()
+
     # ----------------
     # SubClass Methods
     # ----------------
@@ -105,6 +123,15 @@ class sdssService(Service):
             return self._idToPath(id, 'npy')
 
 
+    def dataPaths(self, ids, fmt='npy'):
+        '''Get the paths to the SDSS spectrum data files for a list of IDs.
+        '''
+        if fmt.lower() == 'fits':       # 'fmt' can be a client format
+            return self._idsToPaths(ids, 'fits')
+        else:
+            return self._idsToPaths(ids, 'npy')
+
+
     def previewPath(self, id):
         '''Get the path to the SDSS spectrum preview file.
         '''
@@ -112,10 +139,12 @@ class sdssService(Service):
 
 
     def getData(self, fname):
-        '''Return the data in the named file as a numpy array.
+        '''Return the data in the named file as a numpy array.  NPY files
+           are memory-mapped read-only, so only the pages actually used
+           (e.g. the loglam endpoints in listSpan) are read from disk.
         '''
         if fname[-3:] == 'npy':
-            return np.load(str(fname))
+            return np.load(str(fname), mmap_mode='r', allow_pickle=False)
         elif fname[-4:] == 'fits':
             data = Table.read(fname, hdu=1).as_array()
             retval = BytesIO()
@@ -200,20 +229,17 @@ class sdssService(Service):
         '''Find a file given a plate/mjd/fiber tuple.
         '''
         st_time = time.time()
-        base_path = self.fits_root if extn == 'fits' else self.cache_root
+        prefix = self._fits_prefix if extn == 'fits' else self._cache_prefix
+        fname = f'{plate:04d}/spec-{plate:04d}-{mjd:05d}-{fiber:04d}.{extn}'
         for r in self.run2d:
-            spath = base_path + \
-                  '%s/sdss/spectro/redux/%s/spectra/%04i/spec-%04i-%05i-%04i.%s' % \
-                  (self.release, str(r), plate, plate, mjd, fiber, extn)
+            spath = f'{prefix}sdss/spectro/redux/{r}/spectra/{fname}'
             if os.path.exists(spath):
                 if self.debug and self.verbose:
                     print('_findFile() time0: ' + str(time.time()-st_time))
                 return(spath)
 
         # FALLTHRU
-        spath = base_path + \
-                  '%s/*/spectro/redux/*/spectra/full/%04i/spec-%04i-%05i-%04i.%s' % \
-                  (self.release, plate, plate, mjd, fiber, extn)
+        spath = f'{prefix}*/spectro/redux/*/spectra/full/{fname}'
         files = glob.glob(spath)
         for f in files:
             if os.path.exists(f):
@@ -229,12 +255,9 @@ class sdssService(Service):
     def _buildPath(self, plate, mjd, fiber, run2d, survey, extn):
         '''Build a pathname for the ID.
         '''
-        base_path = self.fits_root if extn == 'fits' else self.cache_root
-        base_path = base_path + \
-                        '%s/%s/spectro/redux/' % (self.release, survey)
-        path = base_path + ('%s/spectra/%04i/' % (run2d, plate))
-        fname = path + 'spec-%04i-%05i-%04i.%s' %  (plate, mjd, fiber, extn)
-        return fname
+        prefix = self._fits_prefix if extn == 'fits' else self._cache_prefix
+        return (f'{prefix}{survey}/spectro/redux/{run2d}/spectra/'
+                f'{plate:04d}/spec-{plate:04d}-{mjd:05d}-{fiber:04d}.{extn}')
 
 
     def _expandID(self, plate, mjd, fiber, run2d):
@@ -329,32 +352,110 @@ class sdssService(Service):
         '''Get the path to a SDSS spectrum data file with the named extension.
         '''
         st_time = time.time()
-        survey = 'sdss'			# default survey name
-        if isinstance(id, str) or isinstance(id, np.unicode):
+        id = self._normID(id)
+        fname = self._cachedPath(id, extn)
+        if fname is not None:
+            return fname
+
+        if isinstance(id, tuple):
+            fname = self._locate(*self._tupleFields(id), extn)
+        else:
+            # The ID is a 'specobjid' object
+            u = unpack_specobjid(np.array([id], dtype=np.uint64))
+            fname = self._locate(u.plate[0], u.mjd[0], u.fiber[0],
+                                 u.run2d[0], 'sdss', extn)
+        self._cachePath(id, extn, fname)
+
+        if self.debug and self.verbose:
+            print('_idToPath() time: ' + str(time.time()-st_time))
+        return fname
+
+
+    def _idsToPaths(self, ids, extn):
+        '''Get the paths for a list of IDs.  All the 'specobjid' values in
+           the list are unpacked in a single call.
+        '''
+        st_time = time.time()
+        ids = [self._normID(id) for id in ids]
+        paths = [self._cachedPath(id, extn) for id in ids]
+
+        # Unpack the uncached 'specobjid' values in a single call.
+        sidx = [i for i, id in enumerate(ids)
+                if paths[i] is None and not isinstance(id, tuple)]
+        fields = [None] * len(ids)
+        if sidx:
+            u = unpack_specobjid(np.array([ids[i] for i in sidx],
+                                          dtype=np.uint64))
+            for i, p, m, f, r in zip(sidx, u.plate.tolist(), u.mjd.tolist(),
+                                     u.fiber.tolist(), u.run2d.tolist()):
+                fields[i] = (p, m, f, r, 'sdss')
+
+        for i, id in enumerate(ids):
+            if paths[i] is None:
+                paths[i] = self._locate(*(fields[i] or self._tupleFields(id)),
+                                        extn)
+                self._cachePath(id, extn, paths[i])
+
+        if self.debug and self.verbose:
+            print('_idsToPaths() time: ' + str(time.time()-st_time))
+        return paths
+
+
+    def _cachedPath(self, id, extn):
+        '''Return a previously resolved file path, or None.
+        '''
+        fname = self._path_cache.get((id, extn))
+        if fname is not None:
+            self._path_cache.move_to_end((id, extn))
+        return fname
+
+
+    def _cachePath(self, id, extn, fname):
+        '''Save a resolved file path, dropping the least recently used
+           entry when the cache is full.  Only a file with the requested
+           extension is kept: a FITS fallback is looked up again so the
+           cached file is used as soon as it appears.
+        '''
+        if not fname.endswith('.' + extn.lstrip('.')):
+            return
+        self._path_cache[(id, extn)] = fname
+        self._path_cache.move_to_end((id, extn))
+        if len(self._path_cache) > PATH_CACHE_SIZE:
+            self._path_cache.popitem(last=False)
+
+
+    def _normID(self, id):
+        '''Convert a string 'specobjid' to an int, and check the ID type.
+        '''
+        if isinstance(id, str):
             if id[0] == '(':
                 id = id.astype(np.uint64)
             else:
                 id = int(id)
-        if isinstance(id, int) or isinstance(id, np.uint64):
-            # The ID is a 'specobjid' object
-            u = unpack_specobjid(np.array([id], dtype=np.uint64))
-            plate = u.plate[0]
-            mjd = u.mjd[0]
-            fiber = u.fiber[0]
-            run2d = u.run2d[0]
-        elif isinstance(id, tuple):
-            # The ID is a '(plate,mjd,fiber[,run2d])' tuple object
-            if len(id) >= 3:
-                 plate, mjd, fiber = id[0], id[1], id[2]
-                 run2d = id[3] if len(id) == 4 else ''
-                 survey = id[4] if len(id) == 5 else 'sdss'
-                 if len(id) == 5:
-                     survey = id[4].lower()
-                     if survey.startswith('segue'):
-                         survey = 'sdss'
-        else:
+        if not isinstance(id, (int, np.uint64, tuple)):
             raise Exception('Unknown identifier: ' + str(id))
+        return id
 
+
+    def _tupleFields(self, id):
+        '''Get the (plate, mjd, fiber, run2d, survey) values of a
+           '(plate,mjd,fiber[,run2d[,survey]])' tuple identifier.
+        '''
+        if len(id) < 3:
+            raise Exception('Unknown identifier: ' + str(id))
+        plate, mjd, fiber = id[0], id[1], id[2]
+        run2d = id[3] if len(id) == 4 else ''
+        survey = 'sdss'
+        if len(id) == 5:
+            survey = id[4].lower()
+            if survey.startswith('segue'):
+                survey = 'sdss'
+        return plate, mjd, fiber, run2d, survey
+
+
+    def _locate(self, plate, mjd, fiber, run2d, survey, extn):
+        '''Find the data file for the given ID fields and extension.
+        '''
         # Strip a leading '.' from the extension name if present.
         if extn.startswith('.'):
             extn = extn[1:]
@@ -375,9 +476,6 @@ class sdssService(Service):
             fname = self._findFile(plate, mjd, fiber, 'fits')
             if fname is None:
                 raise Exception('File not found: ')
-
-        if self.debug and self.verbose:
-            print('_idToPath() time: ' + str(time.time()-st_time))
         return fname
 
 
@@ -395,6 +493,44 @@ def toSigned(number, bitLength):
         return number & mask
 
 
+def _as_u64(a):
+    '''Return 'a' as a contiguous uint64 array, copying only if needed.
+    '''
+    if isinstance(a, np.ndarray) and a.dtype == np.uint64 and \
+       a.flags.c_contiguous:
+        return a
+    return np.ascontiguousarray(a, dtype=np.uint64)
+
+
+def _checkRange(name, val, nbits, offset=0):
+    '''Raise a ValueError unless every value of a specObjID field fits in
+       its 'nbits' wide bit field.  'offset' is the amount subtracted from
+       the field before packing and is only used in the message.
+    '''
+    v = np.asarray(val)
+    if v.size and (v.min() < 0 or v.max() >= (1 << nbits)):
+        raise ValueError("%s values must be in the range %d-%d!" %
+                         (name, offset, offset + (1 << nbits) - 1))
+
+
+# Pattern of a 'vN_M_P' run2d version string.
+_run2d_re = re.compile(r'v(\d+)_(\d+)_(\d+)')
+
+@functools.lru_cache(maxsize=None)
+def _run2dInt(run2d):
+    '''Convert a run2d string (an integer or 'vN_M_P') to its integer code.
+    '''
+    try:
+        return int(run2d)
+    except ValueError:
+        # Try a "vN_M_P" string.
+        m = _run2d_re.match(run2d)
+        if m is None:
+            raise ValueError("Could not extract integer run2d value!")
+        N, M, P = m.groups()
+        return (int(N) - 5)*10000 + int(M) * 100 + int(P)
+
+
 def pack_specobjid(plate, mjd, fiber, run2d):
     '''Convert SDSS spectrum identifiers into CAS-style specObjID.
 
@@ -447,10 +583,26 @@ def pack_specobjid(plate, mjd, fiber, run2d):
 
     Examples
     --------
-    >>> print(pack_specobjid(4055,408,55359,'v5_7_0'))
+    >>> print(pack_specobjid(4055,55359,408,'v5_7_0'))
     [4565636362342690816]
     '''
 
+    # Fast path for a single ID given as plain ints, which skips building
+    # and shifting one-element arrays.
+    if isinstance(plate, int) and isinstance(fiber, int) and \
+       isinstance(mjd, int) and isinstance(run2d, (int, str)):
+        if isinstance(run2d, str):
+            run2d = _run2dInt(run2d)
+        for name, val, nbits, offset in (('plate', plate, 14, 0),
+                                         ('fiber', fiber, 12, 0),
+                                         ('mjd', mjd - 50000, 14, 50000),
+                                         ('run2d', run2d, 14, 0)):
+            if not 0 <= val < (1 << nbits):
+                _checkRange(name, val, nbits, offset)
+        return np.array([(plate << 50) | (fiber << 38) |
+                         ((mjd - 50000) << 24) | (run2d << 10)],
+                        dtype=np.uint64)
+
     if isinstance(plate, int):
         plate = np.array([plate], dtype=np.uint64)
     if isinstance(fiber, int):
@@ -460,26 +612,17 @@ def pack_specobjid(plate, mjd, fiber, run2d):
     else:
         mjd = mjd - 50000
     if isinstance(run2d, str):
-        try:
-            run2d = np.array([int(run2d)], dtype=np.uint64)
-        except ValueError:
-            # Try a "vN_M_P" string.
-            m = re.match(r'v(\d+)_(\d+)_(\d+)', run2d)
-            if m is None:
-                raise ValueError("Could not extract integer run2d value!")
-            else:
-                N, M, P = m.groups()
-            run2d = np.array([(int(N) - 5)*10000 + int(M) * 100 + int(P)],
-                             dtype=np.uint64)
+        run2d = np.array([_run2dInt(run2d)], dtype=np.uint64)
     elif isinstance(run2d, int):
         run2d = np.array([run2d], dtype=np.uint64)
     else:
-        cnv = {'103': 103, '104': 104, '26': 26,
-               'v5_10_0': 1000, 'v5_13_0': 1300
-               }
-        R = np.array(run2d)
-        for t in list(cnv):
-            R = np.where(R == t, cnv[t], R)
+        # Convert each distinct run2d string once and gather the codes
+        # back by index.
+        R = np.asarray(run2d)
+        if R.dtype.kind == 'U':
+            uniq, inv = np.unique(R, return_inverse=True)
+            codes = np.array([_run2dInt(r) for r in uniq.tolist()])
+            R = codes[inv.reshape(R.shape)]
         run2d = R.astype(np.uint32)
 
     # Check that all inputs have the same shape.
@@ -491,21 +634,60 @@ def pack_specobjid(plate, mjd, fiber, run2d):
     if plate.shape != run2d.shape:
         raise ValueError("run2d.shape does not match plate.shape!")
 
-    # Compute the specObjID
+    # Check that each value fits in its bit field.  The fields are ORed
+    # together over the array, one read-only pass each, and the high bits
+    # tested at once; the per-field check only runs to report an error.
+    # MJD is checked after the 50000 offset, so a value below 50000 that
+    # wrapped in an unsigned array is caught as well.
     #
-    plate = np.array(plate, dtype=np.uint64)
-    fiber = np.array(fiber, dtype=np.uint64)
-    mjd = np.array(mjd, dtype=np.uint64)
-    run2d = np.array(run2d, dtype=np.uint64)
-
-    specObjID = ((plate << 50) |
-                 (fiber << 38) |
-                 (mjd   << 24) |
-                 (run2d << 10)).astype(np.uint64)
+    plate, fiber, mjd, run2d = (_as_u64(plate), _as_u64(fiber),
+                                _as_u64(mjd), _as_u64(run2d))
+    high = ((np.bitwise_or.reduce(plate, axis=None) >> np.uint64(14)) |
+            (np.bitwise_or.reduce(fiber, axis=None) >> np.uint64(12)) |
+            (np.bitwise_or.reduce(mjd, axis=None) >> np.uint64(14)) |
+            (np.bitwise_or.reduce(run2d, axis=None) >> np.uint64(14)))
+    if high:
+        _checkRange('plate', plate, 14)
+        _checkRange('fiber', fiber, 12)
+        _checkRange('mjd', mjd, 14, offset=50000)
+        _checkRange('run2d', run2d, 14)
+
+    # Compute the specObjID, shifting each field through one scratch
+    # buffer into the output rather than building a temporary per term.
+    #
+    if HAVE_NUMBA:
+        specObjID = np.empty(plate.shape, dtype=np.uint64)
+        _packNumba(plate.reshape(-1), fiber.reshape(-1), mjd.reshape(-1),
+                   run2d.reshape(-1), specObjID.reshape(-1))
+        return specObjID
+
+    specObjID = np.left_shift(plate, np.uint64(50))
+    tmp = np.empty_like(specObjID)
+    for val, shift in ((fiber, 38), (mjd, 24), (run2d, 10)):
+        np.left_shift(val, np.uint64(shift), out=tmp)
+        np.bitwise_or(specObjID, tmp, out=specObjID)
     return specObjID
 
 
-def unpack_specobjid(specObjID):
+# Integer-valued run2d versions given as their 'vN_M_P' string form.
+_run2d_int = {'v5_1_3': '103', 'v5_1_4': '104', 'v5_0_26': '26'}
+
+@functools.lru_cache(maxsize=None)
+def _run2dName(run2d):
+    '''Format an integer run2d field as its version string.
+    '''
+    if run2d == 0:
+        return ''
+    R = 'v{0:d}_{1:d}_{2:d}'.format((run2d // 10000) + 5,
+                                    (run2d % 10000) // 100, run2d % 100)
+    return _run2d_int.get(R, R)
+
+
+# Fields of an unpacked specObjID, one array per field.
+Unpacked = collections.namedtuple('Unpacked', 'plate fiber mjd run2d')
+
+
+def unpack_specobjid(specObjID, fields=Unpacked._fields):
     """Unpack SDSS specObjID into plate, fiber, mjd, run2d.
 
     Parameters
@@ -513,12 +695,15 @@ def unpack_specobjid(specObjID):
     specObjID : :class:`numpy.ndarray`
         An array containing 64-bit integers or strings.  If strings are passed,
         they will be converted to integers internally.
+    fields : sequence of str
+        The fields to return.  Fields not listed are returned as None,
+        e.g. omitting 'run2d' skips formatting the version strings.
 
     Returns
     -------
-    :class:`numpy.recarray`
-        A record array with the same length as `specObjID`, with the columns
-        'plate', 'fiber', 'mjd', 'run2d'.
+    :class:`Unpacked`
+        A named tuple of the 'plate', 'fiber', 'mjd' and 'run2d' arrays,
+        each with the same length as `specObjID`.
 
     Raises
     ------
@@ -533,41 +718,75 @@ def unpack_specobjid(specObjID):
     Example:
     --------
         >>> unpack_specobjid(array([4565636362342690816], dtype=numpy.uint64))
-        rec.array([(4055, 408, 55359, 'v5_7_0', 0)],
-              dtype=[('plate', '<i4'), ('fiber', '<i4'),
-                     ('mjd', '<i4'), ('run2d', '<U8')])
+        Unpacked(plate=array([4055], dtype=int32),
+                 fiber=array([408], dtype=int32),
+                 mjd=array([55359], dtype=int32),
+                 run2d=array(['v5_7_0'], dtype='<U8'))
     """
 
     if isinstance(specObjID, np.uint64) or isinstance(specObjID, int):
         tempobjid = np.array([specObjID], dtype=np.uint64)
-    elif specObjID.dtype.type in [np.string_, np.unicode_]:
+    elif specObjID.dtype.kind in 'SU':
         tempobjid = specObjID.astype(np.uint64)
     elif specObjID.dtype.type is np.uint64:
-        tempobjid = specObjID.copy()
+        tempobjid = specObjID                   # only read, never modified
     else:
         raise ValueError('Unrecognized dtype for specObjID!')
 
-    unpack = np.recarray(tempobjid.shape,
-                         dtype=[('plate', 'i4'), ('fiber', 'i4'),
-                                ('mjd', 'i4'), ('run2d', 'U8')])
-    unpack.plate = np.bitwise_and(tempobjid >> 50, 2**14 - 1)
-    unpack.fiber = np.bitwise_and(tempobjid >> 38, 2**12 - 1)
-    unpack.mjd = np.bitwise_and(tempobjid >> 24, 2**14 - 1) + 50000
-
-    run2d = np.bitwise_and(tempobjid >> 10, 2**14 - 1)
-    if run2d == 0:
-        R = np.array('')
+    if HAVE_NUMBA:
+        flat = np.ascontiguousarray(tempobjid).reshape(-1)
+        plate = np.empty(flat.shape, dtype=np.int32)
+        fiber = np.empty(flat.shape, dtype=np.int32)
+        mjd = np.empty(flat.shape, dtype=np.int32)
+        run2d = np.empty(flat.shape, dtype=np.uint64)
+        _unpackNumba(flat, plate, fiber, mjd, run2d)
+        plate = plate.reshape(tempobjid.shape)
+        fiber = fiber.reshape(tempobjid.shape)
+        mjd = mjd.reshape(tempobjid.shape)
+        run2d = run2d.reshape(tempobjid.shape)
     else:
-        N = ((run2d // 10000) + 5).tolist()
-        M = ((run2d % 10000) // 100).tolist()
-        P = (run2d % 100).tolist()
-        R = np.array(
-            ['v{0:d}_{1:d}_{2:d}'.format(n, m, p) for n, m, p in zip(N, M, P)])
-
-        # Fix the integer version conversion.
-        R = np.where(R == 'v5_1_3', '103', R)
-        R = np.where(R == 'v5_1_4', '104', R)
-        R = np.where(R == 'v5_0_26', '26', R)
-    unpack.run2d = R
-
-    return unpack
+        plate = (np.bitwise_and(tempobjid >> 50, 2**14 - 1)
+                 ).astype(np.int32)
+        fiber = (np.bitwise_and(tempobjid >> 38, 2**12 - 1)
+                 ).astype(np.int32)
+        mjd = (np.bitwise_and(tempobjid >> 24, 2**14 - 1) + 50000
+               ).astype(np.int32)
+        run2d = np.bitwise_and(tempobjid >> 10, 2**14 - 1)
+
+    # Only a handful of distinct run2d values occur in practice, so format
+    # each one once and gather the strings back by index.
+    if 'run2d' in fields:
+        uniq, inv = np.unique(run2d, return_inverse=True)
+        R = np.array([_run2dName(r) for r in uniq.tolist()], dtype='U8')
+        run2d = R[inv.reshape(run2d.shape)]
+
+    vals = (plate, fiber, mjd, run2d)
+    return Unpacked(*[v if f in fields else None
+                      for f, v in zip(Unpacked._fields, vals)])
+
+
+if HAVE_NUMBA:
+    # The shift amounts and masks are uint64 so that numba does not promote
+    # the mixed signed/unsigned arithmetic to float64.
+    @njit(parallel=True, cache=True)
+    def _packNumba(plate, fiber, mjd, run2d, out):
+        '''Fused shift-and-or of the specObjID fields.
+        '''
+        for i in prange(out.shape[0]):
+            out[i] = ((plate[i] << np.uint64(50)) |
+                      (fiber[i] << np.uint64(38)) |
+                      (mjd[i] << np.uint64(24)) |
+                      (run2d[i] << np.uint64(10)))
+
+    @njit(parallel=True, cache=True)
+    def _unpackNumba(ids, plate, fiber, mjd, run2d):
+        '''Extract the specObjID fields in a single pass over the IDs.
+        '''
+        m14 = np.uint64(2**14 - 1)
+        m12 = np.uint64(2**12 - 1)
+        for i in prange(ids.shape[0]):
+            v = ids[i]
+            plate[i] = (v >> np.uint64(50)) & m14
+            fiber[i] = (v >> np.uint64(38)) & m12
+            mjd[i] = ((v >> np.uint64(24)) & m14) + np.uint64(50000)
+            run2d[i] = (v >> np.uint64(10)) & m14
@@ -8,13 +8,16 @@ __version__ = '20200907'  # yyyymmdd
 
 
 import os
-import sys
 import time
+import socket
 import json
+import struct
+import hashlib
 import optparse
 import logging
 from PIL import Image
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from numpy.lib import recfunctions as rfn
@@ -44,8 +47,20 @@ import numpy as np
 
 
 DEBUG = False                   # Debug flag
+RAW_NUMPY_TYPE = 'application/x-numpy-raw'      # raw array content type
+
+# Maximum number of spectrum file reads in flight at once.  Reads run in
+# the default thread pool so they don't block the event loop; the limit
+# keeps a burst of large requests near the storage device's queue depth.
+# The semaphore itself is created on the running loop at startup and kept
+# in app['spec_io_sem'].
+SPEC_IO_LIMIT = 64
 config = {}			# Global config file
-is_py3 = sys.version_info.major == 3
+
+# Simple host name, looked up once rather than on each config (re)load.
+# Like 'config', this mirrors the value in specserver.py: that module runs
+# as __main__ and imports this one lazily, so it can't be imported here.
+_HOSTNAME = socket.gethostname().split('.')[0]
 
 # Default config file
 DEF_CONFIG = '/opt/services/specserver/spec.conf'
@@ -59,18 +74,14 @@ EXT_CONFIG = '/opt/services/lib/spec.conf'
 def parseConfig(file):
     '''Parse the configuration file.
     '''
-    import socket
     global config
 
     if os.path.exists(file):
         config = json.load(open(file))
-        if is_py3:
-            profiles = list(config['profiles'].keys())    # Py3 version
-        else:
-            profiles = config['profiles'].keys()          # Py2 version
+        profiles = list(config['profiles'].keys())
 
         def_profile = 'default'
-        this_host = socket.gethostname().split('.')[0]    # simple host name
+        this_host = _HOSTNAME
         if this_host in profiles:
             def_profile = this_host
             cfg = config['profiles'][def_profile]
@@ -165,12 +176,12 @@ def profiles(request):
                 prof = config['profiles'][p]
                 if prof['type'] in ['public','external']:
                     txt = txt + ("%16s   %s\n" % (p,str(prof['description'])))
-            return web.Response(text=txt)
+            return _etagResponse(request, txt)
     else:
         raw = config['profiles'][profile].copy()
         del raw['vosEndpoint']                 # delete secrets from the copy
         del raw['vosRootDir']
-        return web.Response(text=json.dumps(raw))
+        return _etagResponse(request, json.dumps(raw))
 
 
 # CONTEXTS -- List the available contexts.
@@ -189,17 +200,17 @@ def contexts(request):
         if fmt == 'csv':
             return ",".join(context)
         elif fmt == 'json':
-            return web.Response(text=json.dumps(config['contexts']))
+            return _etagResponse(request, json.dumps(config['contexts']))
         elif fmt == 'text':
             txt = ''
             for p in context:
                 conf = config['contexts'][p]
                 if conf['type'] in ['public','external']:
                     txt = txt + ("%16s   %s\n" % (p,str(conf['description'])))
-            return web.Response(text=txt)
+            return _etagResponse(request, txt)
     else:
         raw = config['contexts'][context]
-        return web.Response(text=json.dumps(raw))
+        return _etagResponse(request, json.dumps(raw))
 
 
 # CATALOGS -- List the available catalogs for a given dataset context.
@@ -225,7 +236,7 @@ def catalogs(request):
         for p in catalogs:
             cat = config['contexts'][context]['catalogs'][p]
             txt = txt + ("%30s   %s\n" % (p, cat))
-    return web.Response(text=txt)
+    return _etagResponse(request, txt)
 
 
 # VALIDATE -- Validate a client parameter.
@@ -327,22 +338,28 @@ async def getSpec(request):
     # the wavelength limits of the collection, so compute it here so we can
     # still align properly.
     if w0 in [None, 0.0] and w1 in [None, 0.0] and align:
-        w0, w1, nspec = _listSpan(svc, ids)
+        w0, w1, nspec = await _listSpan(request.app, svc, ids)
         
     res = None
     align = (w0 != w1)
     nspec = 0
     ptime = 0.0
-    for id in ids:
+    # Resolve all the data file paths in one batch and read them in
+    # parallel.
+    if fmt.lower() != 'fits':
+        fnames = svc.dataPaths(ids, 'npy')
+        spectra = await _readAll(request.app,
+                                 [svc.getDataAsync(str(f)) for f in fnames])
+    for i, id in enumerate(ids):
         p0 = time.time()
         nspec = nspec + 1
         if fmt.lower() == 'fits':
+            # Send the file straight from the page cache (sendfile).
             fname = svc.dataPath(id, 'fits')
-            data = svc.readFile(str(fname))
-            return web.Response(body=data)
+            return web.FileResponse(str(fname))
         else:
-            fname = svc.dataPath(id, 'npy')
-            data = svc.getData(str(fname))
+            fname = fnames[i]
+            data = spectra[i]
 
         if values != 'all':
             # Extract the subset of values.
@@ -352,21 +369,10 @@ async def getSpec(request):
         if not align:
             f = data
         else:
-            wmin, wmax = data['loglam'][0], data['loglam'][-1]
-            disp = float((wmax - wmin) / float(len(data['loglam'])))
-            lpad = int(np.around(max((wmin - w0) / disp, 0.0)))
-            rpad = int(np.around(max((w1 - wmax) / disp, 0.0)))
-            if lpad == 0 and rpad == 0:
-                f = data
-            else:
-                f = np.pad(data, (lpad,rpad), mode='constant',
-                           constant_values=0)
-                f['loglam'] = np.linspace(w0,w1,len(f)) # patch wavelength array
-
+            f, lpad, rpad = _padSpec(data, w0, w1)
             if debug:
                 print(str(id))
                 print(fname)
-                print('wmin,wmax = (%g,%g)  disp=%g' % (wmin,wmax,disp))
                 print('w0,w1 = (%g,%g)  pad = (%d,%d)' % (w0,w1,lpad,rpad))
                 print('len f = %d   len data = %d' % (len(f),len(data)))
 
@@ -380,6 +386,18 @@ async def getSpec(request):
     if debug:
         print('res type: ' + str(type(res)) + ' shape: ' + str(res.shape))
 
+    # Clients that accept a raw array get the data buffer directly, with
+    # the dtype and shape in the response headers.
+    if RAW_NUMPY_TYPE in request.headers.get('Accept', ''):
+        res = np.ascontiguousarray(res)
+        en_time = time.time()
+        logging.info ('getSpec time: %g  NSpec: %d  Bytes: %d' % \
+                      (en_time-st_time,nspec,res.nbytes))
+        hdrs = {'X-Numpy-Dtype': repr(np.lib.format.dtype_to_descr(res.dtype)),
+                'X-Numpy-Shape': ','.join(map(str, res.shape))}
+        return web.Response(body=memoryview(res.reshape(-1).view(np.uint8)),
+                            content_type=RAW_NUMPY_TYPE, headers=hdrs)
+
     # Convert the array to bytes for return.
     fd = BytesIO()
     np.save(fd, res, allow_pickle=False)
@@ -392,6 +410,79 @@ async def getSpec(request):
     return web.Response(body=_bytes)
 
 
+# GETSPEC_BATCH -- Get a batch of spectra in a single response.
+#
+@routes.post('/spec/getSpec/batch')
+async def getSpecBatch(request):
+    ''' Return a batch of spectra as a stream of length-prefixed payloads
+        (4-byte big-endian size + payload), one per requested ID, in the
+        order requested.  The JSON request body contains the 'ids' list
+        (specobjids or [plate,mjd,fiber[,run2d]] lists) and the 'fmt',
+        'values' and 'context' parameters.  As with getSpec, numpy spectra
+        are padded to the (w0,w1) span, which is optional and computed
+        from the spectra read when not given.
+    '''
+    try:
+        params = await request.json()
+        ids = params['ids']
+        fmt = params['fmt']
+        values = params['values']
+        context = params['context']
+        w0 = float(params.get('w0') or 0.0)
+        w1 = float(params.get('w1') or 0.0)
+    except Exception as e:
+        logging.error ('Param Error: ' + str(e))
+        return web.Response(status=400, text='Param Error: ' + str(e))
+
+    st_time = time.time()
+
+    # Instantiate the dataset service based on the context.
+    svc = _getSvc(context)
+
+    # (plate,mjd,fiber[,run2d]) IDs arrive as lists.  Read all the files
+    # in parallel before framing them in request order.
+    ids = [tuple(id) if isinstance(id, list) else id for id in ids]
+    if fmt.lower() == 'fits':
+        fnames = svc.dataPaths(ids, 'fits')
+        files = await _readAll(request.app,
+                               [svc.readFileAsync(str(f)) for f in fnames])
+    else:
+        fnames = svc.dataPaths(ids, 'npy')
+        files = await _readAll(request.app,
+                               [svc.getDataAsync(str(f)) for f in fnames])
+        if w0 == 0.0 and w1 == 0.0:
+            w0 = min([data['loglam'][0] for data in files])
+            w1 = max([data['loglam'][-1] for data in files])
+
+    parts = []
+    nbytes = 0
+    for i, id in enumerate(ids):
+        if fmt.lower() == 'fits':
+            _bytes = files[i]
+        else:
+            data = files[i]
+            if values != 'all':
+                # Extract the subset of values.
+                dvalues = data[[c for c in list(data.dtype.names) \
+                                if c in values]]
+                data = rfn.repack_fields(dvalues)
+            if w0 != w1:
+                data = _padSpec(data, w0, w1)[0]
+            fd = BytesIO()
+            np.save(fd, data, allow_pickle=False)
+            _bytes = fd.getvalue()
+        parts.append(struct.pack('>I', len(_bytes)))
+        parts.append(_bytes)
+        nbytes = nbytes + len(_bytes)
+
+    en_time = time.time()
+    logging.info ('getSpecBatch time: %g  NSpec: %d  Bytes: %d' % \
+                  (en_time-st_time,len(ids),nbytes))
+
+    return web.Response(body=b''.join(parts),
+                        content_type='application/octet-stream')
+
+
 # PREVIEW -- Get a preview plot of a spectrum.
 #
 @routes.get('/spec/preview')
@@ -409,7 +500,7 @@ async def preview(request):
     svc = _getSvc(context)
     fname = svc.previewPath(spec_id)
 
-    return web.Response(body=svc.readFile(fname))
+    return web.FileResponse(str(fname))
 
 
 # GRIDPLOT -- Return an image which is a grid plot of preview spectra.
@@ -419,25 +510,31 @@ async def gridplot(request):
     ''' Return an image which is a grid plot of preview spectra.
     '''
 
-    def pil_grid(images, max_horiz=np.iinfo(int).max):
-        '''Examples:  pil_grid(imgs)      horizontal
-                      pil_grid(imgs,3)    3-col grid
-                      pil_grid(imgs,1)    vertical
+    def pil_grid(tiles, max_horiz=np.iinfo(int).max):
+        '''Examples:  pil_grid(tiles)      horizontal
+                      pil_grid(tiles,3)    3-col grid
+                      pil_grid(tiles,1)    vertical
+
+           Each tile is a decoded RGB (mode, size, bytes) tuple.  Tiles are
+           copied into a single preallocated array and converted to an
+           image once.
         '''
-        n_images = len(images)
+        n_images = len(tiles)
         n_horiz = min(n_images, max_horiz)
         h_sizes = [0] * n_horiz
         v_sizes = [0] * (int(n_images/n_horiz) + \
                          (1 if n_images % n_horiz > 0 else 0))
-        for i, im in enumerate(images):
+        for i, (mode, size, data) in enumerate(tiles):
             h, v = i % n_horiz, i // n_horiz
-            h_sizes[h] = max(h_sizes[h], im.size[0])
-            v_sizes[v] = max(v_sizes[v], im.size[1])
+            h_sizes[h] = max(h_sizes[h], size[0])
+            v_sizes[v] = max(v_sizes[v], size[1])
         h_sizes, v_sizes = np.cumsum([0] + h_sizes), np.cumsum([0] + v_sizes)
-        im_grid = Image.new('RGB', (h_sizes[-1],v_sizes[-1]),color='white')
-        for i, im in enumerate(images):
-            im_grid.paste(im, (h_sizes[i % n_horiz], v_sizes[i // n_horiz]))
-        return im_grid
+        grid = np.full((v_sizes[-1], h_sizes[-1], 3), 255, dtype=np.uint8)
+        for i, (mode, (w, h), data) in enumerate(tiles):
+            x, y = h_sizes[i % n_horiz], v_sizes[i // n_horiz]
+            grid[y:y+h, x:x+w] = np.frombuffer(data,
+                                               dtype=np.uint8).reshape(h,w,3)
+        return Image.fromarray(grid, 'RGB')
 
     st_time = time.time()
 
@@ -459,15 +556,18 @@ async def gridplot(request):
 
     ids = map(np.uint64, id_list[1:-1].split(','))
     svc = _getSvc(context)
-    imgs = []
-    for p in ids:
-        fname = svc.previewPath(p)
-        imgs.append(Image.open(fname))
 
-    ret_img = pil_grid (imgs, max_horiz=ncols)
+    # Decode the preview tiles in parallel in the default thread pool
+    # (PIL releases the GIL while decoding).
+    loop = asyncio.get_running_loop()
+    tiles = await asyncio.gather(*[
+                 loop.run_in_executor(None, _loadTile, str(svc.previewPath(p)))
+                 for p in ids])
+
+    ret_img = pil_grid (tiles, max_horiz=ncols)
 
     retval = BytesIO()
-    ret_img.save(retval, format='PNG')
+    ret_img.save(retval, format='PNG', compress_level=3)
 
     en_time = time.time()
     logging.info ('plotGrid time: %g' % (en_time - st_time))
@@ -496,7 +596,7 @@ async def listSpan(request):
     ids = svc.expandIDList(id_list)
 
     st_time = time.time()
-    w0,w1,nspec = _listSpan(svc, ids)
+    w0,w1,nspec = await _listSpan(request.app, svc, ids)
     en_time = time.time()
     logging.info ('listSpan time: %g  NSpec: %d' % (en_time-st_time,nspec))
 
@@ -535,34 +635,44 @@ async def stackedImage(request):
 
     svc = _getSvc(context)
     ids = svc.expandIDList(id_list)
-    w0, w1, nspec = _listSpan(svc, ids)
-
-    img_data = None
-    ids = map(int, id_list[1:-1].split(','))
-    for q in ids:
-        fname = svc.dataPath(q, 'npy')
-        data = svc.getData(str(fname))
 
+    # Read each spectrum once and find the span of the list.
+    spectra = await _readAll(request.app,
+                             [svc.getDataAsync(str(f))
+                              for f in svc.dataPaths(ids, 'npy')])
+    nspec = len(spectra)
+    w0 = min([data['loglam'][0] for data in spectra])
+    w1 = max([data['loglam'][-1] for data in spectra])
+
+    # Compute the padding needed to align each spectrum to the span.
+    npix = np.array([len(data['loglam']) for data in spectra])
+    lpad = np.empty(nspec, dtype=int)
+    rpad = np.empty(nspec, dtype=int)
+    for i, data in enumerate(spectra):
         wmin, wmax = data['loglam'][0], data['loglam'][-1]
-        disp = float((wmax - wmin) / float(len(data['loglam'])))
-        lpad = int(np.around(max((wmin - w0) / disp, 0.0)))
-        rpad = int(np.around(max((w1 - wmax) / disp, 0.0)))
-
-        if lpad == 0 and rpad == 0:
-            f = data['flux']
-        else:
-            f = np.pad(data['flux'], (lpad,rpad), mode='constant',
-                       constant_values=0)
-        if img_data is None:
-            img_data = np.array(f)
-        else:
-            for i in range(thick):
-                img_data = np.vstack((img_data,f))
-
-    # Apply the scaling and requested colormap.
+        disp = float((wmax - wmin) / float(npix[i]))
+        lpad[i] = int(np.around(max((wmin - w0) / disp, 0.0)))
+        rpad[i] = int(np.around(max((w1 - wmax) / disp, 0.0)))
+
+    # Fill a preallocated (nspec, width) block with the aligned flux rows,
+    # then replicate rows for the line thickness in a single pass.  The
+    # result is quantized to 8 bits, so single precision is plenty.
+    block = np.zeros((nspec, int((lpad + npix + rpad).max())),
+                     dtype=np.float32)
+    for i, data in enumerate(spectra):
+        block[i, lpad[i]:lpad[i]+npix[i]] = data['flux']
+    reps = np.full(nspec, thick)
+    reps[0] = 1
+    img_data = np.repeat(block, reps, axis=0)
+
+    # Apply the scaling and requested colormap.  As in the original code
+    # the scaled values are not clipped, so anything outside 0-255 wraps
+    # on the uint8 cast rather than saturating.
     zscale = ZScaleInterval()
     z1, z2 = zscale.get_limits(img_data)
-    rescaled = (255.0 / z2 * (img_data - z1)).astype(np.uint8)
+    img_data -= np.float32(z1)
+    img_data *= np.float32(255.0 / z2)
+    rescaled = img_data.astype(np.uint8)
     if inverse:
         rescaled = 255 - rescaled
     if cmap != 'gray':
@@ -669,7 +779,45 @@ async def test_json(request):
 # Utility Methods
 # =======================================
 
-def _listSpan(svc, id_list):
+def _padSpec(data, w0, w1):
+    '''Zero-pad a spectrum to the (w0,w1) log-wavelength span, returning
+       the padded array and the (left,right) padding.  The wavelength array
+       of a padded spectrum is regridded over the span.
+    '''
+    wmin, wmax = data['loglam'][0], data['loglam'][-1]
+    disp = float((wmax - wmin) / float(len(data['loglam'])))
+    lpad = int(np.around(max((wmin - w0) / disp, 0.0)))
+    rpad = int(np.around(max((w1 - wmax) / disp, 0.0)))
+    if lpad == 0 and rpad == 0:
+        return data, 0, 0
+    f = np.pad(data, (lpad,rpad), mode='constant', constant_values=0)
+    f['loglam'] = np.linspace(w0,w1,len(f))     # patch wavelength array
+    return f, lpad, rpad
+
+async def _readSpec(app, coro):
+    '''Await a threaded service read (e.g. getDataAsync or readFileAsync),
+       bounded by the app's spectrum I/O semaphore.
+    '''
+    async with app['spec_io_sem']:
+        return await coro
+
+async def _initIOExecutor(app):
+    '''Startup hook creating the spectrum I/O semaphore on the running
+       loop and sizing the loop's default thread pool, which runs the
+       reads, to the same SPEC_IO_LIMIT.  The stock pool has at most 32
+       workers, which would cap reads below the semaphore.
+    '''
+    app['spec_io_sem'] = asyncio.Semaphore(SPEC_IO_LIMIT)
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=SPEC_IO_LIMIT))
+
+async def _readAll(app, coros):
+    '''Run a list of service reads concurrently, returning the results in
+       order.
+    '''
+    return await asyncio.gather(*[_readSpec(app, c) for c in coros])
+
+async def _listSpan(app, svc, id_list):
     ''' Find the min max wavelength span an of ID list.
     '''
     w0 = 100000
@@ -678,14 +826,30 @@ def _listSpan(svc, id_list):
     #ids = svc.expandIDList(id_list)
     ids = id_list
     nids = 0
-    for p in ids:
+    spectra = await _readAll(app, [svc.getDataAsync(str(f))
+                                   for f in svc.dataPaths(ids, 'npy')])
+    for data in spectra:
         nids = nids + 1
-        fname = svc.dataPath(p, 'npy')
-        data = svc.getData(str(fname))
         w0 = min(w0,data['loglam'][0])
         w1 = max(w1,data['loglam'][-1])
     return w0, w1, nids
 
+def _loadTile(fname):
+    '''Decode a preview image to RGB, returning its (mode, size, bytes).
+    '''
+    with Image.open(fname) as im:
+        im = im.convert('RGB')
+        return im.mode, im.size, im.tobytes()
+
+def _etagResponse(request, text):
+    '''Return a text response tagged with an ETag of its content, or an
+       empty 304 response if the client already has this version.
+    '''
+    etag = '"%s"' % hashlib.md5(text.encode('utf-8')).hexdigest()
+    if request.headers.get('If-None-Match') == etag:
+        return web.Response(status=304, headers={'ETag': etag})
+    return web.Response(text=text, headers={'ETag': etag})
+
 def _getSvc(context):
     '''Return the servie sub-class based on the given context.
     '''
@@ -708,4 +872,5 @@ logging.basicConfig(level=logging.DEBUG)
 # Define the application.
 app = web.Application(client_max_size=4096**2)
 app.add_routes(routes)
+app.on_startup.append(_initIOExecutor)
 
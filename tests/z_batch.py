@@ -0,0 +1,83 @@
+
+import struct
+import numpy as np
+from io import BytesIO
+from specClient import _splitFrames, _npyView, dlSpecError
+
+
+
+DEBUG = False
+
+
+def _spectrum(n, seed):
+    '''Make a small spectrum record array like the one the service returns.
+    '''
+    rng = np.random.default_rng(seed)
+    data = np.zeros(n, dtype=[('loglam', '<f4'), ('flux', '<f4'),
+                              ('ivar', '<f4'), ('and_mask', '<i4')])
+    data['loglam'] = np.linspace(3.55, 3.95, n)
+    data['flux'] = rng.normal(size=n)
+    data['ivar'] = rng.uniform(size=n)
+    return data
+
+
+def _npyBytes(data):
+    fd = BytesIO()
+    np.save(fd, data, allow_pickle=False)
+    return fd.getvalue()
+
+
+def _frame(payloads):
+    '''Frame payloads the way the getSpec/batch endpoint does.
+    '''
+    parts = []
+    for p in payloads:
+        parts.append(struct.pack('>I', len(p)))
+        parts.append(p)
+    return b''.join(parts)
+
+
+def test_frames ():
+    '''Length-prefixed batch framing round-trip, including an empty payload.
+    '''
+    payloads = [b'SIMPLE  =                    T', b'', b'\x00' * 70000]
+    parts = _splitFrames(bytearray(_frame(payloads)))
+    if DEBUG: print([len(p) for p in parts])
+
+    assert len(parts) == len(payloads),'Wrong number of frames'
+    for p, q in zip(parts, payloads):
+        assert bytes(p) == q,'Frame payloads do not match'
+
+    assert _splitFrames(b'') == [],'Empty body should have no frames'
+
+    # A truncated size prefix or payload is an error, not a short list.
+    buf = _frame(payloads)
+    for bad in (buf[:-1], buf + b'\x00\x00'):
+        try:
+            _splitFrames(bad)
+        except dlSpecError:
+            pass
+        else:
+            assert False,'Truncated frame not detected'
+
+
+def test_batch_npy ():
+    '''Spectra framed as .npy payloads come back as equal array views.
+    '''
+    spectra = [_spectrum(n, i) for i, n in enumerate([3840, 4620, 1])]
+    buf = bytearray(_frame([_npyBytes(s) for s in spectra]))
+
+    out = [_npyView(p) for p in _splitFrames(buf)]
+    for a, b in zip(out, spectra):
+        assert a.dtype == b.dtype,'Dtype mismatch'
+        assert np.array_equal(a, b),'Spectrum values do not match'
+
+    # The arrays are views of the (writable) response buffer.
+    assert np.shares_memory(out[0], np.frombuffer(buf, dtype=np.uint8)), \
+        'Array is not a view of the response buffer'
+    out[0]['flux'][0] = 42.0
+    assert out[0]['flux'][0] == 42.0,'Array view is not writable'
+
+
+test_frames ()
+test_batch_npy ()
@@ -0,0 +1,103 @@
+
+import time
+from specClient import ttl_cache, dlSpecError
+
+
+
+DEBUG = False
+TTL = 0.5
+
+
+class _Client(object):
+    '''Minimal stand-in for the client state ttl_cache keys on.
+    '''
+    def __init__(self, svc_url='http://localhost:6998/spec'):
+        self.svc_url = svc_url
+        self.auth_token = 'anonymous.0.0.anon_access'
+        self.ncalls = 0
+        self.fail = False
+
+    @ttl_cache(TTL)
+    def listing(self, context='default', fmt='json'):
+        self.ncalls = self.ncalls + 1
+        if self.fail:
+            raise dlSpecError('Error 500 reading listing')
+        return {'context': context, 'fmt': fmt, 'n': self.ncalls}
+
+
+def test_ttl ():
+    '''Fresh entries are served from the cache and expire after the TTL.
+    '''
+    c = _Client(svc_url='http://test_ttl/spec')
+    v1 = c.listing('sdss_dr16')
+    v2 = c.listing(context='sdss_dr16')
+    if DEBUG: print(v1, v2, c.ncalls)
+    assert c.ncalls == 1,'Cached value not reused'
+    assert v1 == v2,'Cached value changed'
+
+    # Returned values are copies, so callers can't modify the cache.
+    v2['n'] = -1
+    assert c.listing('sdss_dr16')['n'] == 1,'Cache entry was modified'
+
+    # Different arguments are cached separately.
+    c.listing('sdss_dr16', fmt='text')
+    assert c.ncalls == 2,'Arguments not part of the cache key'
+
+    # Another auth token is cached separately.
+    c.auth_token = 'demo.1.1.xyzzy'
+    c.listing('sdss_dr16')
+    assert c.ncalls == 3,'Token not part of the cache key'
+    c.auth_token = 'anonymous.0.0.anon_access'
+
+    time.sleep(TTL + 0.1)
+    v3 = c.listing('sdss_dr16')
+    assert c.ncalls == 4,'Expired entry not refreshed'
+    assert v3['n'] == 4,'Expired entry served after refresh'
+
+
+def test_no_cache ():
+    '''no_cache=True forces a refresh, and its failure is not hidden.
+    '''
+    c = _Client(svc_url='http://test_no_cache/spec')
+    c.listing()
+    c.listing(no_cache=True)
+    assert c.ncalls == 2,'no_cache did not force a refresh'
+    assert c.listing()['n'] == 2,'Refreshed value not cached'
+
+    c.fail = True
+    try:
+        c.listing(no_cache=True)
+    except dlSpecError:
+        pass
+    else:
+        assert False,'Failed no_cache refresh was hidden'
+
+    # An expired entry whose refresh fails is still served ...
+    time.sleep(TTL + 0.1)
+    assert c.listing()['n'] == 2,'Stale value not served on failure'
+
+    # ... but a failure is never cached in its place.
+    c.fail = False
+    assert c.listing()['n'] == 5,'Failure was cached'
+
+
+def test_no_entry ():
+    '''A failing call with nothing cached raises and stores nothing.
+    '''
+    c = _Client(svc_url='http://test_no_entry/spec')
+    c.fail = True
+    try:
+        c.listing()
+    except dlSpecError:
+        pass
+    else:
+        assert False,'Failure with no cached value was hidden'
+
+    c.fail = False
+    assert c.listing()['n'] == 2,'Failure was cached'
+    assert c.ncalls == 2,'Wrong number of calls'
+
+
+test_ttl ()
+test_no_cache ()
+test_no_entry ()
@@ -0,0 +1,47 @@
+
+import numpy as np
+from io import BytesIO
+from specClient import _npyView, dlSpecError
+
+
+
+DEBUG = False
+
+
+def _npyBytes(data):
+    fd = BytesIO()
+    np.save(fd, data, allow_pickle=False)
+    return fd.getvalue()
+
+
+def test_npyview ():
+    '''_npyView handles 1.0/2.0 headers, Fortran order and bad input.
+    '''
+    a = np.arange(24, dtype='>i8').reshape(2, 3, 4)
+    v = _npyView(_npyBytes(a))
+    assert v.shape == a.shape and v.dtype == a.dtype,'Bad .npy header parse'
+    assert np.array_equal(v, a),'Bad .npy values'
+
+    f = np.asfortranarray(np.arange(12, dtype=np.float32).reshape(3, 4))
+    v = _npyView(_npyBytes(f))
+    assert v.flags.f_contiguous and np.array_equal(v, f),'Bad Fortran order'
+
+    fd = BytesIO()
+    np.lib.format.write_array(fd, a, version=(2, 0))
+    v = _npyView(fd.getvalue())
+    assert np.array_equal(v, a),'Bad version 2.0 .npy parse'
+
+    v = _npyView(_npyBytes(np.zeros((0, 5), dtype=np.float64)))
+    assert v.shape == (0, 5),'Bad empty array shape'
+
+    fd = BytesIO()
+    np.save(fd, np.array([1, 'a'], dtype=object), allow_pickle=True)
+    try:
+        _npyView(fd.getvalue())
+    except dlSpecError:
+        pass
+    else:
+        assert False,'Object array not rejected'
+
+
+test_npyview ()
@@ -0,0 +1,51 @@
+
+import numpy as np
+from io import BytesIO
+from specClient import _loadNumpy, RAW_NUMPY_TYPE
+
+
+
+DEBUG = False
+
+
+def _spectrum(n, seed):
+    '''Make a small spectrum record array like the one the service returns.
+    '''
+    rng = np.random.default_rng(seed)
+    data = np.zeros(n, dtype=[('loglam', '<f4'), ('flux', '<f4'),
+                              ('ivar', '<f4'), ('and_mask', '<i4')])
+    data['loglam'] = np.linspace(3.55, 3.95, n)
+    data['flux'] = rng.normal(size=n)
+    data['ivar'] = rng.uniform(size=n)
+    return data
+
+
+def _npyBytes(data):
+    fd = BytesIO()
+    np.save(fd, data, allow_pickle=False)
+    return fd.getvalue()
+
+
+def test_rawnumpy ():
+    '''application/x-numpy-raw bodies are rebuilt from the dtype/shape
+       headers the service sends.
+    '''
+    for a in (_spectrum(100, 7),
+              np.arange(30, dtype='<f8').reshape(5, 6),
+              np.zeros((0,), dtype='<i4')):
+        hdrs = {'Content-Type': RAW_NUMPY_TYPE,
+                'X-Numpy-Dtype': repr(np.lib.format.dtype_to_descr(a.dtype)),
+                'X-Numpy-Shape': ','.join(map(str, a.shape))}
+        if DEBUG: print(hdrs)
+        v = _loadNumpy(a.tobytes(), hdrs)
+        assert v.dtype == a.dtype,'Raw dtype mismatch'
+        assert v.shape == a.shape,'Raw shape mismatch'
+        assert np.array_equal(v, a),'Raw values do not match'
+
+    # Without the raw headers the body is read as a .npy file.
+    a = np.arange(10)
+    v = _loadNumpy(_npyBytes(a), {'Content-Type': 'application/octet-stream'})
+    assert np.array_equal(v, a),'Fallback .npy parse failed'
+
+
+test_rawnumpy ()
@@ -58,5 +58,68 @@ def test_specobjid ():
     assert u.run2d[0] == str(run2d),'Bad run2d value'
 
 
+def test_run2d ():
+    '''Round-trip IDs whose run2d is an integer-valued ('103') or a
+       'vN_M_P' version string, given singly and as a mixed array.
+    '''
+    plate = np.array([1963, 4055, 3586], dtype=np.uint64)
+    mjd = np.array([54331, 55359, 55181], dtype=np.uint64)
+    fiber = np.array([19, 408, 1], dtype=np.uint64)
+    run2d = np.array(['103', 'v5_7_0', '26'])
+
+    s = pack_specobjid (4055, 55359, 408, 'v5_7_0')
+    assert s[0] == 4565636362342690816,'Bad v5_7_0 specobjid'
+    s = pack_specobjid (1963, 54331, 19, '103')
+    assert s[0] == 2210146812474530816,'Bad 103 specobjid'
+
+    ids = pack_specobjid (plate, mjd, fiber, run2d)
+    if DEBUG: print(ids)
+    u = unpack_specobjid(ids)
+    assert np.array_equal(u.plate, plate),'Plate values don\'t match'
+    assert np.array_equal(u.mjd, mjd),'MJD values don\'t match'
+    assert np.array_equal(u.fiber, fiber),'Fiber values don\'t match'
+    assert list(u.run2d) == list(run2d),'Run2d values don\'t match'
+
+    # String IDs unpack the same as integers.
+    u = unpack_specobjid(np.array([str(i) for i in ids]))
+    assert list(u.run2d) == list(run2d),'String ID run2d values don\'t match'
+
+
+def test_fields ():
+    '''Only the requested fields are unpacked, the rest are None.
+    '''
+    ids = np.array([2210146812474530816, 4565636362342690816], dtype=np.uint64)
+    full = unpack_specobjid(ids)
+
+    u = unpack_specobjid(ids, fields=('plate', 'run2d'))
+    assert u.fiber is None and u.mjd is None,'Unrequested field returned'
+    assert np.array_equal(u.plate, full.plate),'Plate values don\'t match'
+    assert list(u.run2d) == list(full.run2d),'Run2d values don\'t match'
+
+    u = unpack_specobjid(ids, fields=['mjd'])
+    assert u.plate is None and u.run2d is None,'Unrequested field returned'
+    assert np.array_equal(u.mjd, full.mjd),'MJD values don\'t match'
+
+
+def test_range ():
+    '''Values that don't fit their bit field raise a ValueError.
+    '''
+    for args in ((4055, 408, 55359, 'v5_7_0'),       # fiber/mjd swapped
+                 (1963, 49999, 19, '103'),           # mjd below 50000
+                 (20000, 54331, 19, '103'),          # plate > 14 bits
+                 (np.array([1963], dtype=np.uint64),
+                  np.array([40000], dtype=np.uint64),
+                  np.array([19], dtype=np.uint64), np.array(['103']))):
+        try:
+            pack_specobjid (*args)
+        except ValueError:
+            pass
+        else:
+            assert False,'Out of range value not rejected'
+
+
 test_sdss()
 test_specobjid ()
+test_run2d ()
+test_fields ()
+test_range ()